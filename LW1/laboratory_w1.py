@@ -1,4 +1,7 @@
 import random
+from array import array
+
+IN_PROGRESS = -1  # marks a (non-terminal, length) count that is still being computed
 
 class Grammar:
     def __init__(self, V_n, V_t, P, S):
@@ -11,27 +14,51 @@ class Grammar:
         gen_str = []
 
         while len(gen_str) < num_strings:
-            new_string = self.S
+            # leftmost derivation: the sentential form is `done` followed by `pending` read from the end,
+            # so replacing the first non-terminal is a pop plus a push of the replacement (O(|rhs|))
+            done = []
+            pending = [self.S]
             steps = 0
 
-            while any(symbol in self.V_n for symbol in new_string) and steps < max_conv:
-                for i, symbol in enumerate(new_string):
-                    if symbol in self.V_n:
-                        replacements = self.P[symbol]
-                        corresponding_replacement = random.choice(replacements)
-
-                        # replaces non-terminal symbol at the first occurrence in the string
-                        new_string = new_string[:i] + corresponding_replacement + new_string[i + 1:]
-                        steps += 1
-                        break
-
-            if any(symbol in self.V_n for symbol in new_string):
+            while pending:
+                symbol = pending.pop()
+                if symbol not in self.V_n:
+                    done.append(symbol)
+                    continue
+                if steps >= max_conv:
+                    pending.append(symbol)
+                    break
+
+                replacements = self.P[symbol]
+                corresponding_replacement = random.choice(replacements)
+                pending.extend(reversed(corresponding_replacement))
+                steps += 1
+
+            if pending:
                 continue  # for skiping incomplete strings such as 'dabcabcabcA' since i set a limit of 10 conversions
 
-            gen_str.append(new_string)
+            gen_str.append("".join(done))
 
         return gen_str
 
+    def count_strings(self, max_length):
+        # number of strings of every length 0..max_length (derivations if the grammar is not right-linear)
+        return self.counter().count_strings(max_length)
+
+    def sample_strings(self, length, num_strings=5):
+        # uniform over the strings of that length for a right-linear grammar, over derivations otherwise
+        counter = self.counter()
+        return [counter.sample(length) for _ in range(num_strings)]
+
+    def counter(self):
+        # a right-linear grammar (terminals, then at most one non-terminal, no A -> B) is counted on its DFA,
+        # where every string has exactly one path; derivations would count an ambiguous string twice
+        for prods in self.P.values():
+            for prod in prods:
+                if prod != "ε" and (prod in self.V_n or any(symbol in self.V_n for symbol in prod[:-1])):
+                    return DerivationCounter(self)
+        return LanguageCounter(self)
+
     def to_finite_automaton(self):
         Q = set()  # the sttates
         Sigma = self.V_t  # input symbols
@@ -87,6 +114,160 @@ class Grammar:
         return FiniteAutomaton(Q, Sigma, Delta, q0, F)
 
 
+class DerivationCounter:
+    def __init__(self, grammar):
+        self.grammar = grammar
+        # every character of a production is one symbol, "ε" is the empty tuple
+        self.productions = {vn: [() if rhs == "ε" else tuple(rhs) for rhs in grammar.P.get(vn, [])]
+                            for vn in grammar.V_n}
+        self.counts = {vn: [] for vn in grammar.V_n}  # counts[A][n] = derivations of A with n characters
+        self.sequence_counts = {}  # (symbols, j, n) -> derivations of symbols[j:] with n characters
+
+    def count(self, symbol, n):
+        if symbol not in self.counts:
+            return 1 if len(symbol) == n else 0  # a terminal only gives itself
+        if n < 0:
+            return 0
+        self.extend(n)
+        return self.counts[symbol][n]
+
+    def extend(self, max_length):
+        # filling the table one length at a time so the recursion stays shallow
+        done = min(len(row) for row in self.counts.values()) - 1
+        for n in range(done + 1, max_length + 1):
+            for vn in sorted(self.counts):
+                self._count_at(vn, n)
+
+    def _count_at(self, vn, n):
+        row = self.counts[vn]
+        if len(row) > n:
+            if row[n] == IN_PROGRESS:
+                raise ValueError(f"Cycle of ε/unit productions through '{vn}', strings can't be counted")
+            return row[n]
+
+        row.append(IN_PROGRESS)
+        row[n] = sum(self.sequence_count(symbols, 0, n) for symbols in self.productions[vn])
+        return row[n]
+
+    def sequence_count(self, symbols, j, n):
+        if j == len(symbols):
+            return 1 if n == 0 else 0
+
+        key = (symbols, j, n)
+        total = self.sequence_counts.get(key)
+        if total is None:
+            head = symbols[j]
+            if head in self.counts:
+                total = sum(self._count_at(head, m) * self.sequence_count(symbols, j + 1, n - m)
+                            for m in range(n + 1))
+            else:
+                total = self.sequence_count(symbols, j + 1, n - len(head)) if len(head) <= n else 0
+            self.sequence_counts[key] = total
+        return total
+
+    def count_strings(self, max_length):
+        return [self.count(self.grammar.S, n) for n in range(max_length + 1)]
+
+    def sample(self, length, rng=random):
+        total = self.count(self.grammar.S, length)
+        if total == 0:
+            raise ValueError(f"The grammar derives no string of length {length}")
+
+        result = []
+        stack = [((self.grammar.S,), 0, length)]  # (symbols, position, characters left)
+        while stack:
+            symbols, j, n = stack.pop()
+            if j == len(symbols):
+                continue
+            head = symbols[j]
+
+            if head not in self.counts:
+                result.append(head)
+                stack.append((symbols, j + 1, n - len(head)))
+                continue
+
+            # first how many characters head gives, then which production, both weighted by the counts
+            r = rng.randrange(self.sequence_count(symbols, j, n))
+            for m in range(n + 1):
+                weight = self.count(head, m) * self.sequence_count(symbols, j + 1, n - m)
+                if r < weight:
+                    break
+                r -= weight
+            stack.append((symbols, j + 1, n - m))
+
+            r = rng.randrange(self.count(head, m))
+            for production in self.productions[head]:
+                weight = self.sequence_count(production, 0, m)
+                if r < weight:
+                    break
+                r -= weight
+            stack.append((production, 0, m))
+
+        return "".join(result)
+
+
+class LanguageCounter:
+    def __init__(self, grammar):
+        # A -> w B becomes a chain of states spelling w that ends in B, A -> w ends in 'qf' and
+        # A -> ε makes A final; compile() then determinizes it
+        Delta = {}
+        F = set()
+        chains = 0
+        for vn, prods in grammar.P.items():
+            for prod in prods:
+                if prod == "ε":
+                    F.add(vn)
+                    continue
+                target = "qf"
+                if prod[-1] in grammar.V_n:
+                    target, prod = prod[-1], prod[:-1]
+                current = vn
+                for k, symbol in enumerate(prod):
+                    if k + 1 == len(prod):
+                        next_state = target
+                    else:
+                        next_state = f"chain{chains}"
+                        chains += 1
+                    Delta.setdefault((current, symbol), set()).add(next_state)
+                    current = next_state
+
+        symbols = {symbol for (_, symbol) in Delta}
+        self.dfa = FiniteAutomaton(set(grammar.V_n), symbols, Delta, grammar.S, F).compile()
+        self.symbols = sorted(symbols)  # the columns of the compiled table
+        self.counts = [list(self.dfa.accepting)]  # counts[n][q] = strings of length n accepted from state q
+
+    def count(self, state, n):
+        table, width = self.dfa.table, self.dfa.width
+        while len(self.counts) <= n:
+            shorter = self.counts[-1]
+            self.counts.append([sum(shorter[table[q * width + column]] for column in range(width))
+                                for q in range(len(shorter))])
+        return self.counts[n][state]
+
+    def count_strings(self, max_length):
+        return [self.count(1, n) for n in range(max_length + 1)]  # row 1 is the start
+
+    def sample(self, length, rng=random):
+        if self.count(1, length) == 0:
+            raise ValueError(f"The grammar derives no string of length {length}")
+
+        # every character is picked with the weight of the strings that can still follow it
+        table, width = self.dfa.table, self.dfa.width
+        result = []
+        state = 1
+        for n in range(length, 0, -1):
+            r = rng.randrange(self.count(state, n))
+            for column in range(width):
+                next_state = table[state * width + column]
+                weight = self.count(next_state, n - 1)
+                if r < weight:
+                    break
+                r -= weight
+            result.append(self.symbols[column])
+            state = next_state
+        return "".join(result)
+
+
 class FiniteAutomaton:
     def __init__(self, Q, Sigma, Delta, q0, F):
         self.Q = Q
@@ -112,6 +293,97 @@ class FiniteAutomaton:
         # checking if any final state is reached, including 'qf'
         return any(state in self.F or state == 'qf' for state in state_current)
 
+    def compile(self):
+        # subset construction straight into a flat int table: row 0 is the dead state,
+        # every other row is one reachable set of NFA states, columns are the interned symbols
+        symbols = sorted(self.Sigma | {symbol for (_, symbol) in self.Delta})
+        width = len(symbols)
+        start = frozenset({self.q0})
+        ids = {start: 1}
+        order = [start]
+        table = array('i', [0]) * (2 * width)
+        accepting = bytearray(2)
+
+        i = 0
+        while i < len(order):
+            state_set = order[i]
+            row = ids[state_set] * width
+            accepting[ids[state_set]] = any(state in self.F or state == 'qf' for state in state_set)
+            for column, k in enumerate(symbols):
+                next_state = set()
+                for state in state_set:
+                    next_state.update(self.Delta.get((state, k), ()))
+                if not next_state:
+                    continue  # stays 0, the dead state
+                next_state = frozenset(next_state)
+                if next_state not in ids:
+                    ids[next_state] = len(ids) + 1
+                    order.append(next_state)
+                    table.extend(array('i', [0]) * width)
+                    accepting.append(0)
+                table[row + column] = ids[next_state]
+            i += 1
+
+        return CompiledAutomaton(symbols, table, accepting)
+
+    def strings_belong_to_language(self, strings):
+        # batch version: the strings are put in a trie, so a prefix shared by many strings is simulated once
+        children = [{}]  # node -> {symbol: child node}, node 0 is the empty prefix
+        ends = [[]]  # node -> positions of the input strings that end there
+        for i, str_input in enumerate(strings):
+            node = 0
+            for k in str_input:
+                child = children[node].get(k)
+                if child is None:
+                    child = len(children)
+                    children[node][k] = child
+                    children.append({})
+                    ends.append([])
+                node = child
+            ends[node].append(i)
+
+        results = [False] * sum(len(positions) for positions in ends)
+
+        # depth-first walk carrying the set of active states, an empty set cuts the whole subtree (stays False)
+        stack = [(0, {self.q0})]
+        while stack:
+            node, state_current = stack.pop()
+
+            if ends[node]:
+                accepted = any(state in self.F or state == 'qf' for state in state_current)
+                for i in ends[node]:
+                    results[i] = accepted
+
+            for k, child in children[node].items():
+                next_state = set()
+                for state in state_current:
+                    if (state, k) in self.Delta:
+                        next_state.update(self.Delta[(state, k)])
+                if next_state:
+                    stack.append((child, next_state))
+
+        return results
+
+class CompiledAutomaton:
+    def __init__(self, symbols, table, accepting):
+        self.symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.width = len(symbols)
+        self.table = table  # table[state * width + symbol] = next state, 0 is the dead state
+        self.accepting = accepting  # one byte per state
+
+    def string_belong_to_language(self, str_input):
+        # same answers as FiniteAutomaton.string_belong_to_language, but only integer indexing per character
+        table, width, index = self.table, self.width, self.symbol_index
+        state = 1
+        for k in str_input:
+            column = index.get(k)
+            if column is None:
+                return False
+            state = table[state * width + column]
+            if not state:
+                return False
+        return self.accepting[state] == 1
+
 def grammar_var20():
     V_n = {"S", "A", "B", "C"}
     V_t = {"a", "b", "c", "d"}
@@ -140,15 +412,13 @@ class Main:
 
         # test if FA accepts generated strings
         print("\nTesting FA with generated strings:")
-        for test in generated_str:
-            is_valid = finite_automaton.string_belong_to_language(test)
+        for test, is_valid in zip(generated_str, finite_automaton.strings_belong_to_language(generated_str)):
             print(f"Does the FA accept '{test}'? {is_valid}")
 
         # additional tests
         custom_str = ["dd", "dabadabacd", "dabcd", "abc"]
         print("\nTesting FA with custom strings:")
-        for test in custom_str:
-            is_valid = finite_automaton.string_belong_to_language(test)
+        for test, is_valid in zip(custom_str, finite_automaton.strings_belong_to_language(custom_str)):
             print(f"Does the FA accept '{test}'? {is_valid}")
 
 if __name__ == "__main__":
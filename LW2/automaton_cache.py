@@ -0,0 +1,40 @@
+import hashlib
+import os
+from collections.abc import Mapping, Set
+
+import compiled_automaton as ca
+import grammar as gr
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".automaton_cache")
+
+
+def content_hash(source):
+    """ Hashes a Grammar or a FiniteAutomaton by its content, the order of sets and dicts does not matter. """
+    def canonical(value):
+        """ Sorted, order independent text form of sets, dicts and lists. """
+        if isinstance(value, Set):
+            return "{" + ",".join(sorted(canonical(item) for item in value)) + "}"
+        if isinstance(value, Mapping):
+            return "{" + ",".join(sorted(f"{canonical(k)}:{canonical(v)}" for k, v in value.items())) + "}"
+        if isinstance(value, (list, tuple)):
+            return "[" + ",".join(canonical(item) for item in value) + "]"
+        return repr(value)
+
+    if isinstance(source, gr.Grammar):
+        parts = ["grammar", source.V_n, source.V_t, source.P, source.S]
+    else:
+        parts = ["automaton", source.Q, source.Sigma, source.Delta, source.q0, source.F]
+    return hashlib.sha256(canonical(parts).encode("utf-8")).hexdigest()
+
+
+def cached_compile(source, cache_dir=CACHE_DIR):
+    """ Returns the compiled DFA of a Grammar or FiniteAutomaton, converting it only if it is not cached yet. """
+    path = os.path.join(cache_dir, content_hash(source) + ".dfa")
+    if os.path.exists(path):
+        return ca.CompiledAutomaton.load(path)
+
+    fa = source.to_finite_automaton() if isinstance(source, gr.Grammar) else source
+    compiled = fa.compile()
+    os.makedirs(cache_dir, exist_ok=True)
+    compiled.save(path)
+    return compiled
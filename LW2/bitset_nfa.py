@@ -0,0 +1,109 @@
+import epsilon_closure as ec
+
+LARGE = 1024  # from this many states on, steps collect bits in a byte buffer instead of ORing big ints
+
+
+class BitsetNFA:
+    def __init__(self, fa):
+        """ The Constructor of the class. """
+        # every NFA state gets a bit position, a set of states is then just a Python int
+        names = set(fa.Q) | {fa.q0}
+        for (state, symbol), next_states in fa.Delta.items():
+            names.add(state)
+            names.update(next_states)
+        self.states = sorted(names, key=str)  # bit i stands for self.states[i]
+        self.position = {state: i for i, state in enumerate(self.states)}  # positions, not masks: O(n) memory
+        position = self.position
+
+        # ε-moves are resolved once: every state is mapped to the bitset of its ε-closure,
+        # an automaton without ε-moves skips the table (every closure would be the state alone)
+        epsilon_edges = [[] for _ in self.states]
+        has_epsilon = False
+        for (state, symbol), next_states in fa.Delta.items():
+            if symbol == ec.EPSILON:
+                epsilon_edges[position[state]].extend(position[next_state] for next_state in next_states)
+                has_epsilon = True
+        self.closure = ec.closure_index(len(self.states), epsilon_edges) if has_epsilon else None
+
+        # successors[symbol][i] holds the target positions of state i on symbol (sparse, not masks),
+        # step() ORs their closures (or single bits) together
+        self.successors = {}
+        for (state, symbol), next_states in fa.Delta.items():
+            if symbol == ec.EPSILON:
+                continue
+            row = self.successors.get(symbol)
+            if row is None:
+                row = self.successors[symbol] = [()] * len(self.states)
+            row[position[state]] = tuple(position[next_state] for next_state in next_states)
+
+        self.large = len(self.states) >= LARGE
+        self.start = self.closed(position[fa.q0])
+        self.final = self.mask(state for state in fa.F if state in position)
+
+    def closed(self, i):
+        """ Bitset of the ε-closure of the state at position i. """
+        mask = self.closure[i] if self.closure is not None else None
+        return mask if mask is not None else 1 << i
+
+    def mask(self, states):
+        """ Turns an iterable of state names into a bitset. """
+        # bits are set in a byte buffer and converted once, ORing shifted ints would cost O(n) per state
+        buffer = bytearray((len(self.states) + 7) // 8)
+        for state in states:
+            i = self.position[state]
+            buffer[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buffer, "little")
+
+    def step(self, mask, symbol):
+        """ Returns the bitset of states reachable from mask on symbol, one OR per target of an active state. """
+        row = self.successors.get(symbol)
+        if row is None:
+            return 0
+        if self.large:
+            return self._step_large(mask, row)
+
+        closure = self.closure
+        result = 0
+        while mask:
+            lowest = mask & -mask  # isolating the lowest set bit
+            if closure is None:
+                for target in row[lowest.bit_length() - 1]:
+                    result |= 1 << target
+            else:
+                for target in row[lowest.bit_length() - 1]:
+                    closed = closure[target]
+                    result |= closed if closed is not None else 1 << target
+            mask ^= lowest
+        return result
+
+    def _step_large(self, mask, row):
+        # every OR or bit trick on an n-bit int costs O(n), so the active positions are read from the
+        # binary string once and the targets are set in a byte buffer that is converted once
+        closure = self.closure
+        buffer = bytearray((len(self.states) + 7) // 8)
+        extra = 0  # non-trivial ε-closures, still ORed as masks
+        for i in positions(mask):
+            for target in row[i]:
+                closed = closure[target] if closure is not None else None
+                if closed is None:
+                    buffer[target >> 3] |= 1 << (target & 7)
+                else:
+                    extra |= closed
+        return int.from_bytes(buffer, "little") | extra
+
+    def is_final(self, mask):
+        """ Checks if at least one state of the bitset is final. """
+        return mask & self.final != 0
+
+    def names(self, mask):
+        """ Produces the sorted state names of a bitset, only needed for readable output. """
+        return [self.states[i] for i in positions(mask)]
+
+
+def positions(mask):
+    """ Yields the set bit positions of mask in increasing order, in O(n) C work plus O(set bits). """
+    text = format(mask, "b")[::-1]
+    i = text.find("1")
+    while i != -1:
+        yield i
+        i = text.find("1", i + 1)
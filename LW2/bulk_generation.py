@@ -0,0 +1,170 @@
+import hashlib
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import derivation as dv
+
+
+def shard_seed(seed, shard, round_number=0):
+    """ Seed of one shard, it depends only on the global seed, the shard number and the round (not on the worker). """
+    # random.Random hashes string seeds with SHA-512, so this is stable everywhere
+    return f"{seed}:{shard}" if round_number == 0 else f"{seed}:{shard}:{round_number}"
+
+
+DEFAULT_SHARDS = 16  # fixed, so the corpus of a seed never depends on the pool size
+RETRY_FACTOR = 20  # with dedupe generation stops after RETRY_FACTOR * total derived strings
+SPILL_DIR = "spill"  # per round and partition files of the dedupe mode, removed at the end
+
+
+def digest_of(string):
+    """ 16 byte hash of a string, sets of these stand in for the strings themselves. """
+    return hashlib.blake2b(string.encode("utf-8"), digest_size=16).digest()
+
+
+def partition_of(digest, shards):
+    """ The partition (output file) that owns a string when deduplicating, taken from its hash. """
+    return int.from_bytes(digest[:8], "little") % shards
+
+
+def generate_shard(grammar, count, path, seed, max_conv=10, strategy="random"):
+    """ Generates count strings into one file, returns (written, incomplete, attempts). """
+    rng = random.Random(seed)
+    engine = dv.DerivationEngine(grammar)
+    written = incomplete = attempts = 0
+
+    with open(path, "w", encoding="utf-8") as f:
+        while written < count:
+            attempts += 1
+            new_string = engine.derive(strategy, max_conv, rng)
+            if new_string is None:
+                incomplete += 1  # still has non-terminals after max_conv steps, it is retried
+                continue
+            f.write(new_string)
+            f.write("\n")
+            written += 1
+
+    return written, incomplete, attempts
+
+
+def spill_shard(grammar, count, spill_paths, seed, max_conv=10, strategy="random"):
+    """ Generates count strings, each one into the spill file of its hash partition, returns (incomplete, attempts). """
+    rng = random.Random(seed)
+    engine = dv.DerivationEngine(grammar)
+    written = incomplete = attempts = 0
+
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(path, "w", encoding="utf-8")) for path in spill_paths]
+        while written < count:
+            attempts += 1
+            new_string = engine.derive(strategy, max_conv, rng)
+            if new_string is None:
+                incomplete += 1
+                continue
+            f = files[partition_of(digest_of(new_string), len(files))]
+            f.write(new_string)
+            f.write("\n")
+            written += 1
+
+    return incomplete, attempts
+
+
+def merge_partition(path, spill_paths):
+    """ Appends the spilled strings that path doesn't hold yet, in spill order, returns (added, duplicates). """
+    # every string of a partition ends up here, so one set of digests per partition dedupes globally
+    seen = set()
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            seen.update(digest_of(line[:-1]) for line in f)
+
+    added = duplicates = 0
+    with open(path, "a", encoding="utf-8") as out:
+        for spill_path in spill_paths:
+            with open(spill_path, encoding="utf-8") as f:
+                for line in f:
+                    digest = digest_of(line[:-1])
+                    if digest in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(digest)
+                    out.write(line)
+                    added += 1
+            os.remove(spill_path)
+    return added, duplicates
+
+
+def split_quota(total, shards):
+    """ The quota of every shard, fixed up front so the output never depends on scheduling or on workers. """
+    return [total // shards + (1 if i < total % shards else 0) for i in range(shards)]
+
+
+def generate_to_files(grammar, total, out_dir, shards=None, workers=None, seed=0, max_conv=10,
+                      strategy="random", dedupe=False, prefix="strings"):
+    """ Generates total strings into sharded files with a process pool, the same seed and shards give the same files. """
+    shards = shards or DEFAULT_SHARDS
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, f"{prefix}_{i:05d}.txt") for i in range(shards)]
+
+    started = time.perf_counter()
+    written = duplicates = incomplete = attempts = rounds = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if not dedupe:
+            futures = [pool.submit(generate_shard, grammar, quota, paths[i], shard_seed(seed, i), max_conv, strategy)
+                       for i, quota in enumerate(split_quota(total, shards))]
+            for future in futures:
+                shard_written, shard_incomplete, shard_attempts = future.result()
+                written += shard_written
+                incomplete += shard_incomplete
+                attempts += shard_attempts
+        else:
+            # every derived string is kept: the shards spill it to the file of its hash partition, then
+            # each partition is deduplicated on its own; a round only derives what is still missing and
+            # generation stops when a round adds nothing new or RETRY_FACTOR * total strings were derived
+            spill_dir = os.path.join(out_dir, SPILL_DIR)
+            os.makedirs(spill_dir, exist_ok=True)
+            for path in paths:
+                open(path, "w").close()
+
+            derived = 0
+            while written < total and derived < RETRY_FACTOR * total:
+                need = min(total - written, RETRY_FACTOR * total - derived)
+                spills = [[os.path.join(spill_dir, f"{prefix}_r{rounds}_s{i:05d}_p{p:05d}.txt") for p in range(shards)]
+                          for i in range(shards)]
+                futures = [pool.submit(spill_shard, grammar, quota, spills[i], shard_seed(seed, i, rounds),
+                                       max_conv, strategy)
+                           for i, quota in enumerate(split_quota(need, shards))]
+                for future in futures:
+                    shard_incomplete, shard_attempts = future.result()
+                    incomplete += shard_incomplete
+                    attempts += shard_attempts
+                derived += need
+                rounds += 1
+
+                # a partition reads the spills of all shards in shard order, the result is the same for any pool size
+                futures = [pool.submit(merge_partition, paths[p], [spills[i][p] for i in range(shards)])
+                           for p in range(shards)]
+                added = 0
+                for future in futures:
+                    partition_added, partition_duplicates = future.result()
+                    added += partition_added
+                    duplicates += partition_duplicates
+                written += added
+                if added == 0:
+                    break  # the language (within max_conv) has no new strings left
+            os.rmdir(spill_dir)
+    seconds = time.perf_counter() - started
+
+    return {
+        "files": paths,
+        "strings": written,
+        "requested": total,
+        "shortfall": total - written,  # only with dedupe: the language ran out of new strings within the retries
+        "duplicates": duplicates,
+        "incomplete": incomplete,
+        "attempts": attempts,
+        "rounds": rounds,  # dedupe rounds, the first one derives total strings, the later ones the shortfall
+        "seconds": seconds,
+        "strings_per_second": written / seconds if seconds else float("inf"),
+    }
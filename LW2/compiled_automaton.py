@@ -0,0 +1,259 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import finite_automaton
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the batch API, single strings work without it
+    np = None
+
+DEAD_STATE = 0  # every compiled automaton reserves row 0 as the dead (trap) state
+
+# binary file layout: header | '\0' separated names (symbols, then states) | padding to 4 bytes |
+# int32 transition table | one acceptance byte per state
+FILE_MAGIC = b"LW2DFA01"
+FILE_HEADER = struct.Struct("<8siiiI")  # magic, number of states, number of symbols, start state, size of the names
+
+
+class CompiledAutomaton:
+    def __init__(self, states, symbols, table, start, accepting):
+        """ The Constructor of the class. """
+        self.states = states  # state names, the position in the list is the state id
+        self.symbols = symbols  # alphabet symbols, the position in the list is the column id
+        self.symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.table = table  # flat int32 rows: table[state * len(symbols) + symbol] -> next state
+        self.start = start  # id of the initial state
+        self.accepting = accepting  # bitmap with one byte per state, 1 marks a final state
+        self._batch_tables = None  # numpy copies of the table, built on the first accepts_many call
+
+    @classmethod
+    def from_dfa(cls, fa):
+        """ Interns the states and symbols of a DFA and builds the dense transition table. """
+        # collecting every state name, also the ones that only show up inside Delta
+        names = set(fa.Q) | {fa.q0}
+        symbols = set(fa.Sigma)
+        for (state, symbol), next_states in fa.Delta.items():
+            names.add(state)
+            names.update(next_states)
+            symbols.add(symbol)
+
+        # sorting keeps the ids stable between runs (sets of strings are not ordered)
+        states = [None] + sorted(names, key=str)  # None stands for the dead state
+        symbols = sorted(symbols, key=str)
+        state_index = {state: i for i, state in enumerate(states)}
+        symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+
+        width = len(symbols)
+        table = array('i', [DEAD_STATE]) * (len(states) * width)
+        for (state, symbol), next_states in fa.Delta.items():
+            if len(next_states) > 1:
+                raise ValueError(f"Automaton is not deterministic on ({state}, {symbol}), convert it to a DFA first")
+            for next_state in next_states:
+                table[state_index[state] * width + symbol_index[symbol]] = state_index[next_state]
+
+        accepting = bytearray(len(states))
+        for state in fa.F:
+            if state in state_index:
+                accepting[state_index[state]] = 1
+
+        return cls(states, symbols, table, state_index[fa.q0], accepting)
+
+    def accepts(self, str_input):
+        """ Checks membership with a tight loop of integer lookups. """
+        table = self.table
+        width = len(self.symbols)
+        symbol_index = self.symbol_index
+        state = self.start
+
+        for k in str_input:
+            symbol = symbol_index.get(k)
+            if symbol is None:
+                return False  # the symbol is not part of the alphabet at all
+            state = table[state * width + symbol]
+            if state == DEAD_STATE:
+                return False  # once in the dead state nothing can be accepted anymore
+
+        return self.accepting[state] == 1
+
+    def distances_to_final(self):
+        """ For every state the fewest steps needed to reach a final state (None if it never can). """
+        width = len(self.symbols)
+        predecessors = [[] for _ in self.states]
+        for state in range(len(self.states)):
+            for column in range(width):
+                predecessors[self.table[state * width + column]].append(state)
+
+        # backward BFS starting from all final states at once
+        distance = [None] * len(self.states)
+        frontier = [state for state in range(len(self.states)) if self.accepting[state]]
+        for state in frontier:
+            distance[state] = 0
+        while frontier:
+            next_frontier = []
+            for state in frontier:
+                for previous in predecessors[state]:
+                    if distance[previous] is None:
+                        distance[previous] = distance[state] + 1
+                        next_frontier.append(previous)
+            frontier = next_frontier
+        return distance
+
+    def iter_language(self, limit=None, max_len=None):
+        """ Yields the accepted strings in shortlex order (by length, then alphabetically), without duplicates. """
+        width = len(self.symbols)
+        distance = self.distances_to_final()
+        if distance[self.start] is None or (max_len is not None and distance[self.start] > max_len):
+            return  # the language is empty (or has nothing short enough)
+
+        # symbols are sorted, so expanding the frontier in order keeps every level in alphabetical order
+        frontier = [(self.start, "")]
+        length = 0
+        produced = 0
+        while frontier:
+            for state, prefix in frontier:
+                if self.accepting[state]:
+                    if limit is not None and produced >= limit:
+                        return
+                    yield prefix
+                    produced += 1
+
+            if max_len is not None and length == max_len:
+                return
+            length += 1
+
+            # a prefix is only kept if its state can still reach a final state within max_len
+            next_frontier = []
+            for state, prefix in frontier:
+                row = state * width
+                for column in range(width):
+                    next_state = self.table[row + column]
+                    steps = distance[next_state]
+                    if steps is None or (max_len is not None and length + steps > max_len):
+                        continue
+                    next_frontier.append((next_state, prefix + self.symbols[column]))
+            frontier = next_frontier
+
+    def to_finite_automaton(self):
+        """ Converts the table back into a FiniteAutomaton, the dead state is left out. """
+        width = len(self.symbols)
+        Delta = {}
+        for state in range(1, len(self.states)):
+            for column, symbol in enumerate(self.symbols):
+                next_state = self.table[state * width + column]
+                if next_state != DEAD_STATE:
+                    Delta[(self.states[state], symbol)] = {self.states[next_state]}
+
+        Q = set(self.states[1:])
+        F = {self.states[state] for state in range(1, len(self.states)) if self.accepting[state]}
+        return finite_automaton.FiniteAutomaton(Q, set(self.symbols), Delta, self.states[self.start], F)
+
+    def save(self, path):
+        """ Writes the compiled automaton in the binary layout that load() maps back without parsing. """
+        if not all(isinstance(name, str) for name in self.symbols + self.states[1:]):
+            raise ValueError("Only automata with string states and symbols can be saved")
+
+        names = "\0".join(list(self.symbols) + [""] + list(self.states[1:])).encode("utf-8")
+        padding = -(FILE_HEADER.size + len(names)) % 4  # the int32 table has to start on a 4 byte boundary
+
+        table = array('i', self.table)
+        if sys.byteorder != "little":
+            table.byteswap()  # the file is always little endian
+
+        # writing to a temporary file first, so a reader never maps a half written automaton
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(FILE_HEADER.pack(FILE_MAGIC, len(self.states), len(self.symbols), self.start, len(names)))
+            f.write(names)
+            f.write(b"\0" * padding)
+            f.write(table.tobytes())
+            f.write(bytes(self.accepting))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """ Maps a saved automaton read-only, the table is used straight from the page cache. """
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n_states, n_symbols, start, names_size = FILE_HEADER.unpack_from(mapping, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} is not a compiled automaton file")
+        if sys.byteorder != "little":
+            raise ValueError("Compiled automaton files can only be mapped on little endian machines")
+
+        offset = FILE_HEADER.size
+        names = mapping[offset:offset + names_size].decode("utf-8").split("\0")
+        symbols, states = names[:n_symbols], [None] + names[n_symbols + 1:]
+        offset += names_size + (-(FILE_HEADER.size + names_size) % 4)
+
+        # the views keep the mapping alive, several processes mapping the same file share its pages
+        view = memoryview(mapping)
+        table_size = n_states * n_symbols * 4
+        table = view[offset:offset + table_size].cast('i')
+        accepting = view[offset + table_size:offset + table_size + n_states]
+
+        return cls(states, symbols, table, start, accepting)
+
+    def _numpy_tables(self):
+        """ Builds (once) the flat numpy transition table, the code point lookup and the final states mask. """
+        if self._batch_tables is None:
+            width = len(self.symbols)
+
+            # the extra last column is for symbols outside the alphabet, it always leads to the dead state
+            table = np.zeros((len(self.states), width + 1), dtype=np.int32)
+            table[:, :width] = np.frombuffer(self.table, dtype=np.int32).reshape(len(self.states), width)
+
+            # maps a unicode code point straight to its column, multi-character symbols can never match a
+            # character; every byte has an entry and the last one stands for all larger code points
+            single_chars = [symbol for symbol in self.symbols if isinstance(symbol, str) and len(symbol) == 1]
+            size = max(256, max((ord(symbol) for symbol in single_chars), default=0) + 2)
+            lookup = np.full(size, width, dtype=np.int32)
+            for symbol in single_chars:
+                lookup[ord(symbol)] = self.symbol_index[symbol]
+
+            accepting = np.frombuffer(bytes(self.accepting), dtype=np.uint8).astype(bool)
+            self._batch_tables = (table.ravel(), lookup, accepting)
+        return self._batch_tables
+
+    def accepts_many(self, strings):
+        """ Checks a whole batch of strings at once, returns a boolean array in input order. """
+        strings = list(strings)
+        if np is None:
+            # plain fallback when numpy is not installed, still a boolean array
+            return array('b', map(self.accepts, strings))
+
+        table, lookup, accepting = self._numpy_tables()
+        width = len(self.symbols) + 1
+        result = np.zeros(len(strings), dtype=bool)
+
+        # the whole batch becomes one buffer of code points (one byte each if it is all ASCII),
+        # string i is codes[end[i] - len(string i):end[i]]
+        text = "".join(strings)
+        if text.isascii():
+            codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+        else:
+            codes = np.minimum(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32), len(lookup) - 1)
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+        end = np.cumsum(lengths)
+        result[lengths == 0] = accepting[self.start]
+
+        # only the strings that are neither finished nor dead are stepped, one fancy-index per step;
+        # the dead ones simply stay False
+        rows = np.flatnonzero(lengths)
+        position = end[rows] - lengths[rows]
+        end = end[rows]
+        state = np.full(len(rows), self.start, dtype=np.int32)
+        while len(rows):
+            state = table[state * width + lookup[codes[position]]]
+            position += 1
+
+            finished = position == end
+            result[rows[finished]] = accepting[state[finished]]
+            keep = np.flatnonzero(~finished & (state != DEAD_STATE))
+            rows, state, position, end = rows[keep], state[keep], position[keep], end[keep]
+
+        return result
@@ -0,0 +1,105 @@
+import random
+
+HEAD = 0  # node 0 is a sentinel before the first symbol of the sentential form
+
+
+class DerivationEngine:
+    def __init__(self, grammar):
+        """ The Constructor of the class. """
+        # the ids of the interned core cover every symbol of the productions, anything that is not
+        # a non-terminal is a terminal (also symbols missing from V_t)
+        core = grammar.core
+        self.names = core.symbols.names
+        self.is_nonterminal = [flag == 1 for flag in core.nonterminal]
+        self.productions = [[] for _ in self.names]  # symbol id -> list of right-hand sides as id lists
+        for k, vn_id in enumerate(core.lhs):
+            for p in core.productions_of(k):
+                self.productions[vn_id].append(list(core.rhs(p)))
+        self.start = core.symbols.ids[grammar.S]
+
+    def derive(self, strategy="random", max_steps=None, rng=random):
+        """ Derives one string ('leftmost', 'rightmost' or 'random' rewriting), None if max_steps is not enough. """
+        if strategy not in ("leftmost", "rightmost", "random"):
+            raise ValueError(f"Unknown derivation strategy: {strategy}")
+
+        # the sentential form is a doubly linked list of nodes kept in flat lists,
+        # so replacing one node by a right-hand side costs O(|rhs|) no matter how long the form is
+        symbol = [None, self.start]
+        nxt = [1, HEAD]
+        prv = [1, HEAD]
+
+        # index of the non-terminal nodes: a pool with O(1) removal for random rewriting,
+        # and a cursor for leftmost/rightmost (everything on the far side of it is terminals only)
+        pool = [1]
+        where = {1: 0}
+        cursor = 1
+
+        def add_nonterminal(node):
+            where[node] = len(pool)
+            pool.append(node)
+
+        def remove_nonterminal(node):
+            i = where.pop(node)
+            last = pool.pop()
+            if last != node:
+                pool[i] = last
+                where[last] = i
+
+        steps = 0
+        while pool:
+            if max_steps is not None and steps >= max_steps:
+                return None
+
+            if strategy == "random":
+                node = pool[rng.randrange(len(pool))]
+            elif strategy == "leftmost":
+                while not self.is_nonterminal[symbol[cursor]]:
+                    cursor = nxt[cursor]
+                node = cursor
+            else:
+                while not self.is_nonterminal[symbol[cursor]]:
+                    cursor = prv[cursor]
+                node = cursor
+
+            choices = self.productions[symbol[node]]
+            if not choices:
+                return None  # a non-terminal without productions can never be rewritten
+            rhs = rng.choice(choices)
+            remove_nonterminal(node)
+            before, after = prv[node], nxt[node]
+
+            if not rhs:
+                # ε: unlinking the node
+                nxt[before], prv[after] = after, before
+                cursor = after if strategy == "leftmost" else before
+            else:
+                # the node itself is reused for the first symbol, the rest get fresh nodes
+                symbol[node] = rhs[0]
+                last = node
+                for symbol_id in rhs[1:]:
+                    new_node = len(symbol)
+                    symbol.append(symbol_id)
+                    nxt.append(after)
+                    prv.append(last)
+                    nxt[last] = new_node
+                    last = new_node
+                prv[after] = last
+
+                current = node
+                while True:
+                    if self.is_nonterminal[symbol[current]]:
+                        add_nonterminal(current)
+                    if current == last:
+                        break
+                    current = nxt[current]
+                cursor = node if strategy == "leftmost" else last
+
+            steps += 1
+
+        # walking the list once at the end to produce the string
+        parts = []
+        node = nxt[HEAD]
+        while node != HEAD:
+            parts.append(self.names[symbol[node]])
+            node = nxt[node]
+        return "".join(parts)
@@ -0,0 +1,82 @@
+EPSILON = "ε"  # the label used for ε-transitions in Delta
+
+
+def strongly_connected_components(n, edges):
+    """ Iterative Tarjan, returns the SCCs of the graph in reverse topological order (sinks first). """
+    index = [None] * n
+    lowlink = [0] * n
+    on_stack = [False] * n
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(n):
+        if index[root] is not None:
+            continue
+
+        # explicit call stack of (node, position in its edge list) instead of recursion
+        work = [(root, 0)]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            node, i = work[-1]
+            if i < len(edges[node]):
+                work[-1] = (node, i + 1)
+                child = edges[node][i]
+                if index[child] is None:
+                    index[child] = lowlink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack[child] = True
+                    work.append((child, 0))
+                elif on_stack[child]:
+                    lowlink[node] = min(lowlink[node], index[child])
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] == index[node]:
+                # node is the root of a component, everything above it on the stack belongs to it
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+
+    return components
+
+
+def closure_index(n, edges):
+    """ Maps every state (0..n-1) to the bitset of its ε-closure, edges[i] lists the ε-successors of i. """
+    # all states of a cycle of ε-moves share one closure, so the work is done once per SCC;
+    # a state whose closure is only itself gets None instead of a mask (1 << i would cost O(i) bits)
+    components = strongly_connected_components(n, edges)
+    component_of = [0] * n
+    for c, component in enumerate(components):
+        for state in component:
+            component_of[state] = c
+
+    # sinks come first, so the closures of the successor components are always ready
+    component_closure = [None] * len(components)
+    for c, component in enumerate(components):
+        if len(component) == 1 and not edges[component[0]]:
+            continue
+        mask = 0
+        for state in component:
+            mask |= 1 << state
+            for next_state in edges[state]:
+                if component_of[next_state] != c:
+                    closed = component_closure[component_of[next_state]]
+                    mask |= closed if closed is not None else 1 << next_state
+        component_closure[c] = mask
+
+    return [component_closure[component_of[state]] for state in range(n)]
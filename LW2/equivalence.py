@@ -0,0 +1,50 @@
+from collections import deque
+
+import epsilon_closure as ec
+
+
+def equivalent(fa1, fa2):
+    """ Hopcroft-Karp check on the lazily determinized automata, returns (True, None) or (False, counterexample). """
+    nfa1, nfa2 = fa1.bitset(), fa2.bitset()
+    symbols = set(fa1.Sigma) | set(fa2.Sigma)
+    for fa in (fa1, fa2):
+        symbols.update(symbol for (_, symbol) in fa.Delta)
+    symbols = sorted(symbols - {ec.EPSILON}, key=str)
+
+    # union-find over the DFA states of both automata, a DFA state is (side, bitset of NFA states)
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:  # path compression
+            parent[x], x = root, parent[x]
+        return root
+
+    start = (nfa1.start, nfa2.start)
+    parent[(0, nfa1.start)] = find((1, nfa2.start))
+
+    # BFS over the pairs, so the first pair that disagrees gives a shortest counterexample
+    came_from = {start: None}  # pair -> (previous pair, symbol)
+    queue = deque([start])
+    while queue:
+        p, q = queue.popleft()
+        if nfa1.is_final(p) != nfa2.is_final(q):
+            word = []
+            pair = (p, q)
+            while came_from[pair] is not None:
+                pair, symbol = came_from[pair]
+                word.append(symbol)
+            return False, "".join(reversed(word))
+
+        for symbol in symbols:
+            # the successors are determinized only now, the product is never built in full
+            next_pair = (nfa1.step(p, symbol), nfa2.step(q, symbol))
+            x, y = find((0, next_pair[0])), find((1, next_pair[1]))
+            if x != y:
+                parent[x] = y
+                came_from[next_pair] = ((p, q), symbol)
+                queue.append(next_pair)
+
+    return True, None
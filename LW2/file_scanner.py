@@ -0,0 +1,246 @@
+import mmap
+import os
+import re
+from array import array
+
+import compiled_automaton as ca
+import epsilon_closure as ec
+import finite_automaton
+
+CHUNK_SIZE = 1 << 20  # 1 MiB windows, the memory used never depends on the size of the file
+NEWLINE = 10  # byte value of '\n'
+NEW_STATE = -1  # a transition of the match DFA that was not computed yet
+
+
+def as_compiled(automaton):
+    """ Accepts either a FiniteAutomaton or an already compiled automaton. """
+    if isinstance(automaton, ca.CompiledAutomaton):
+        return automaton
+    return automaton.compile()
+
+
+def byte_automaton(compiled):
+    """ Compiles the automaton over bytes, every symbol is replaced by the bytes of its UTF-8 encoding. """
+    # a symbol of several bytes gets intermediate states, shared between the symbols of one state
+    # that start with the same bytes; only symbols that are prefixes of each other ('a' and 'ab')
+    # leave something to determinize. States are named q<id>, the intermediate ones q<id>:<bytes in hex>
+    width = len(compiled.symbols)
+    Delta = {}
+    for state in range(1, len(compiled.states)):
+        for column, symbol in enumerate(compiled.symbols):
+            next_state = compiled.table[state * width + column]
+            if next_state == ca.DEAD_STATE or not isinstance(symbol, str) or not symbol:
+                continue
+            encoded = symbol.encode("utf-8")
+            current = f"q{state}"
+            for k in range(len(encoded) - 1):
+                target = f"q{state}:{encoded[:k + 1].hex()}"
+                Delta.setdefault((current, chr(encoded[k])), set()).add(target)
+                current = target
+            Delta.setdefault((current, chr(encoded[-1])), set()).add(f"q{next_state}")
+
+    Q = {f"q{state}" for state in range(1, len(compiled.states))}
+    Sigma = {symbol for _, symbol in Delta}
+    F = {f"q{state}" for state in range(1, len(compiled.states)) if compiled.accepting[state]}
+    return finite_automaton.FiniteAutomaton(Q, Sigma, Delta, f"q{compiled.start}", F).compile()
+
+
+def reversed_automaton(compiled):
+    """ Compiles the reversal of a byte automaton: it accepts the reversed strings of the original one. """
+    width = len(compiled.symbols)
+    Delta = {}
+    for state in range(1, len(compiled.states)):
+        for column, symbol in enumerate(compiled.symbols):
+            next_state = compiled.table[state * width + column]
+            if next_state != ca.DEAD_STATE:
+                Delta.setdefault((f"q{next_state}", symbol), set()).add(f"q{state}")
+
+    # a fresh initial state with ε-moves to all the final states, the old initial state is the only final one
+    start = "start"
+    Delta[(start, ec.EPSILON)] = {f"q{state}" for state in range(1, len(compiled.states)) if compiled.accepting[state]}
+    Q = {f"q{state}" for state in range(1, len(compiled.states))} | {start}
+    return finite_automaton.FiniteAutomaton(Q, set(compiled.symbols), Delta, start, {f"q{compiled.start}"}).compile()
+
+
+def byte_transition_table(compiled):
+    """ Expands the compiled table to 256 columns so a raw byte can be used directly as the column. """
+    width = len(compiled.symbols)
+    delta = array('i', [ca.DEAD_STATE]) * (len(compiled.states) * 256)
+
+    # after byte_automaton() every symbol is a single byte, other symbols never match inside a file
+    for symbol, column in compiled.symbol_index.items():
+        if isinstance(symbol, str) and len(symbol) == 1 and ord(symbol) < 256:
+            byte = ord(symbol)
+            for state in range(len(compiled.states)):
+                delta[state << 8 | byte] = compiled.table[state * width + column]
+
+    return delta
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """ Yields the file as fixed size memoryview windows over a read-only mmap. """
+    if os.path.getsize(path) == 0:
+        return  # an empty file cannot be mapped
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            for offset in range(0, len(mm), chunk_size):
+                chunk = view[offset:offset + chunk_size]
+                yield chunk
+                chunk.release()  # the mmap can only be closed once every window is released
+
+
+def scan_lines(automaton, path, chunk_size=CHUNK_SIZE):
+    """ Yields (line_number, accepted) for every '\\n' separated line of the file. """
+    compiled = byte_automaton(as_compiled(automaton))
+    delta = byte_transition_table(compiled)
+    accepting = compiled.accepting
+    start = compiled.start
+
+    state = start
+    line_number = 0
+    pending = False  # true while the current line has bytes that were not reported yet
+
+    for chunk in iter_chunks(path, chunk_size):
+        # the state simply carries over into the next chunk, a line may span any number of them
+        for byte in chunk:
+            if byte == NEWLINE:
+                yield line_number, accepting[state] == 1
+                line_number += 1
+                state = start
+                pending = False
+            else:
+                state = delta[state << 8 | byte]
+                pending = True
+
+    if pending:
+        yield line_number, accepting[state] == 1  # last line without a trailing newline
+
+
+class MatchDFA:
+    """ The unanchored DFA of Σ*·L over bytes with leftmost-longest priority, built on the fly. """
+    def __init__(self, delta, compiled):
+        """ The Constructor of the class. """
+        self.delta = delta  # byte transition table of the anchored automaton
+        self.accepting = compiled.accepting
+        self.start = compiled.start
+
+        # a state is the tuple of anchored states still running, oldest start first, plus whether
+        # new starts are still added; once a match ended only the older starts and the winner stay
+        self.keys = []
+        self.index = {}
+        self.ends = bytearray()  # 1 if a match ends when the state is entered
+        self.table = array('i')  # state << 8 | byte -> next state, NEW_STATE until computed
+        self.initial = self.state((), True)
+        self.finished = self.state((), False)  # nothing left running: the match is complete
+
+    def state(self, threads, starting):
+        """ Returns the id of a state, adding it (with an empty row of transitions) the first time. """
+        key = (threads, starting)
+        state = self.index.get(key)
+        if state is None:
+            state = self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.ends.append(1 if threads and self.accepting[threads[-1]] else 0)
+            self.table.extend([NEW_STATE] * 256)
+        return state
+
+    def step(self, state, byte):
+        """ Computes (once) the transition of state on byte. """
+        threads, starting = self.keys[state]
+        delta = self.delta
+        next_threads = []
+        for thread in threads + (self.start,) if starting else threads:
+            thread = delta[thread << 8 | byte]
+            if thread != ca.DEAD_STATE and thread not in next_threads:
+                next_threads.append(thread)  # a younger start in the same state behaves like the older one
+
+        # the oldest accepting start wins, younger starts can't be leftmost anymore
+        for k, thread in enumerate(next_threads):
+            if self.accepting[thread]:
+                next_threads = next_threads[:k + 1]
+                starting = False
+                break
+
+        next_state = self.state(tuple(next_threads), starting)
+        self.table[state << 8 | byte] = next_state
+        return next_state
+
+
+def scan_matches(automaton, path, chunk_size=CHUNK_SIZE):
+    """ Yields every (start, end) offset range accepted by the automaton, leftmost-longest like grep -o. """
+    compiled = byte_automaton(as_compiled(automaton))
+    delta = byte_transition_table(compiled)
+    dead = ca.DEAD_STATE
+
+    # bytes that leave the start state alive, everything else can never begin a match
+    first_bytes = bytes(b for b in range(256) if delta[compiled.start << 8 | b] != dead)
+    if not first_bytes:
+        return
+    next_candidate = re.compile(b"[" + re.escape(first_bytes) + b"]").search
+
+    # one forward pass finds where the leftmost-longest match ends, the reversed automaton then
+    # walks back from that end to its leftmost start; no byte is scanned twice unless the forward
+    # pass had to look past the end of a match to know it was the longest one
+    forward = MatchDFA(delta, compiled)
+    table, ends = forward.table, forward.ends
+    initial, finished = forward.initial, forward.finished
+    backward = reversed_automaton(compiled)
+    reverse_delta = byte_transition_table(backward)
+    reverse_accepting = backward.accepting
+
+    buffer = bytearray()  # the bytes a running match may still need, buffer[0] is at offset base
+    base = 0
+    i = 0  # next byte of the buffer to read
+    floor = 0  # offset where the last match ended, the next one can't start before it
+    state = initial
+    end = -1  # offset where the best match so far ends
+
+    chunks = iter_chunks(path, chunk_size)
+    while True:
+        if i == len(buffer):
+            chunk = next(chunks, None)
+            if chunk is not None:
+                # only the bytes from floor on are kept, so the state simply carries over into the next chunk
+                del buffer[:floor - base]
+                i -= floor - base
+                base = floor
+                buffer += chunk
+                continue
+            if end < 0:
+                return
+            state = finished  # the file ended inside a match, the best one so far stands
+
+        else:
+            if state == initial:
+                # nothing is running, the regex engine skips the bytes that can't start a match in C
+                found = next_candidate(buffer, i)
+                i = found.start() if found is not None else len(buffer)
+                floor = base + i
+                if found is None:
+                    continue
+            next_state = table[state << 8 | buffer[i]]
+            if next_state == NEW_STATE:
+                next_state = forward.step(state, buffer[i])
+            state = next_state
+            i += 1
+            if ends[state]:
+                end = base + i
+
+        if state == finished:
+            # the reversed automaton reads the match backwards, its last accepting offset is the start
+            reverse = backward.start
+            start = -1
+            for k in range(end - 1 - base, floor - 1 - base, -1):
+                reverse = reverse_delta[reverse << 8 | buffer[k]]
+                if reverse == dead:
+                    break
+                if reverse_accepting[reverse]:
+                    start = base + k
+            yield start, end
+
+            # matches never overlap, the bytes read after the end are scanned again
+            floor = end
+            i = end - base
+            state = initial
+            end = -1
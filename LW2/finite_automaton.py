@@ -1,13 +1,48 @@
+import time
+import tracemalloc
 import grammar as gr
 import visualization as vs
+import compiled_automaton as ca
+import lazy_dfa as ld
+import bitset_nfa as bn
+import minimization as mn
+import epsilon_closure as ec
+import equivalence as eq
+import product_automaton as pa
+import interning as it
+import instrumentation as ins
+
+
+class DeterminizationLimitExceeded(Exception):
+    """ Raised when convert_ndfa_to_dfa runs out of one of its budgets. """
+    def __init__(self, reason, partial_dfa, counters):
+        super().__init__(f"Subset construction stopped: {reason}")
+        self.reason = reason
+        self.partial_dfa = partial_dfa  # the DFA states and transitions found before the budget ran out
+        self.counters = counters  # states discovered, worklist size, transitions emitted
+
+
 class FiniteAutomaton:
     def __init__(self, Q, Sigma, Delta, q0, F):
         """ The Constructor of the class. """
-        self.Q = Q
-        self.Sigma = Sigma
-        self.Delta = Delta
+        # everything is interned into flat arrays, the usual attributes are read-only views over them
+        self._attach(it.AutomatonCore(Q, Sigma, Delta, q0, F), q0)
+
+    @classmethod
+    def from_core(cls, core, q0):
+        """ Wraps an already built AutomatonCore (used by the file loaders), nothing is copied. """
+        fa = cls.__new__(cls)
+        fa._attach(core, q0)
+        return fa
+
+    def _attach(self, core, q0):
+        self.core = core
+        self.Q = it.FlagSetView(self.core.states, self.core.in_q)
+        self.Sigma = it.FlagSetView(self.core.symbols, self.core.in_sigma)
+        self.Delta = it.DeltaView(self.core)
         self.q0 = q0
-        self.F = F
+        self.F = it.FlagSetView(self.core.states, self.core.final)
+        self._bitset = None  # bitset form, built on first use
 
     def convert_fa_to_rg(self):
         """ Converts a Finite Automaton (FA) to a Regular Grammar (RG) """
@@ -38,19 +73,26 @@ class FiniteAutomaton:
         for (state, symbol), next_states in self.Delta.items():
             if len(next_states) > 1:
                 return False  # more than one transition for the same state-symbol pair -> NDFA
-            if symbol == "ε":
+            if symbol == ec.EPSILON:
                 return False  # the presence of ε-transition -> NDFA
         return True
 
-    def string_belong_to_language(self, str_input, visualize=False):
-        state_current = {self.q0}
+    def bitset(self):
+        """ Returns the bitset form of the automaton (states as bits, state sets as ints), built once. """
+        if self._bitset is None:
+            self._bitset = bn.BitsetNFA(self)
+        return self._bitset
+
+    def string_belong_to_language(self, str_input, visualize=False, stats=None):
+        if stats is not None:
+            return self._simulate_with_stats(str_input, stats)  # the plain loop below stays free of stats calls
+
+        nfa = self.bitset()
+        state_current = nfa.start  # bitset of the active states
         steps = []
 
         for k in str_input:
-            next_state = set()
-            for state in state_current:
-                if (state, k) in self.Delta:
-                    next_state.update(self.Delta[(state, k)])
+            next_state = nfa.step(state_current, k)
 
             steps.append((state_current, k, next_state))  # Save for visualization
 
@@ -59,53 +101,177 @@ class FiniteAutomaton:
 
             state_current = next_state
 
-        accepted = any(state in self.F for state in state_current)
+        accepted = nfa.is_final(state_current)
         return accepted
 
-    def convert_ndfa_to_dfa(self, visualize=False):
+    def _simulate_with_stats(self, str_input, stats):
+        """ string_belong_to_language with every step recorded in stats. """
+        stats.count("bitset_cache_hits" if self._bitset is not None else "bitset_cache_misses")
+        with stats.phase("simulation.bitset"):
+            nfa = self.bitset()
+
+        state_current = nfa.start
+        steps = 0
+        accepted = False
+        with stats.phase("simulation.run"):
+            for k in str_input:
+                next_state = nfa.step(state_current, k)
+                steps += 1
+                stats.peak("active_states", bin(next_state).count("1"))
+                if not next_state:
+                    break
+                state_current = next_state
+            else:
+                accepted = nfa.is_final(state_current)
+
+        stats.count("simulation_steps", steps)
+        return accepted
+
+    def convert_ndfa_to_dfa(self, visualize=False, minimize=False, reduce=False, max_states=None,
+                            max_seconds=None, max_memory=None, progress=None, progress_every=1000, stats=None):
         """ Converts an NDFA to a DFA using the subset construction method. """
-        new_states = {frozenset([self.q0])}  # start state as a set
-        new_delta = {}  # DFA transition table
-        new_final_states = set()
-        unprocessed_states = [frozenset([self.q0])]
-        steps = []  # storing steps for visualization
+        stats = stats or ins.DISABLED
+        if reduce:
+            # shrinking the NDFA first, the subset construction is exponential in its size
+            with stats.phase("convert_ndfa_to_dfa.reduce"):
+                reduced, removed = self.reduce_states()
+            stats.count("reduced_states", removed)
+            return reduced.convert_ndfa_to_dfa(visualize, minimize, False, max_states, max_seconds,
+                                               max_memory, progress, progress_every, stats)
+
+        stats.record_fanout(self)
+        stats.count("bitset_cache_hits" if self._bitset is not None else "bitset_cache_misses")
+        with stats.phase("convert_ndfa_to_dfa.bitset"):
+            nfa = self.bitset()
+        symbols = [symbol for symbol in self.Sigma if symbol != ec.EPSILON]  # ε is already inside the closures
+        new_states = {nfa.start}  # DFA states are bitsets of NFA states
+        new_delta = []  # (state, symbol, next_state) triples, still as bitsets
+        unprocessed_states = [nfa.start]
+
+        def build_dfa():
+            """ Turns the bitset states and triples found so far into a FiniteAutomaton with readable names. """
+            # readable names (like "q0_q1") are produced only now, once per DFA state
+            state_name_map = {state_set: "_".join(nfa.names(state_set)) for state_set in new_states}
+            state_name_map[nfa.start] = "q0"
 
-        state_name_map = {frozenset([self.q0]): "q0"}  # assigning readable names (like "q0_q1")
+            delta = {}
+            steps = []  # storing steps for visualization
+            for current_set, symbol, next_set in new_delta:
+                formatted_current, formatted_next = state_name_map[current_set], state_name_map[next_set]
+                delta[(formatted_current, symbol)] = {formatted_next}
+                steps.append((formatted_current, symbol, formatted_next))
 
-        def format_state(state_set):
-            """ Converts a frozenset into a readable string. """
-            return "_".join(sorted(state_set))
+            new_final_states = {state_name_map[state_set] for state_set in new_states if nfa.is_final(state_set)}
+            return FiniteAutomaton(set(state_name_map.values()), self.Sigma, delta, "q0", new_final_states), steps
 
-        while unprocessed_states:
-            current_set = unprocessed_states.pop()
-            formatted_current = format_state(current_set)  # format DFA state properly
+        # the budgets are only checked when a new DFA state shows up, that is where the growth happens
+        started = time.monotonic()
+        trace_memory = max_memory is not None and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0] if max_memory is not None else 0
 
-            for symbol in self.Sigma:
-                next_set = set()
-                for state in current_set:
-                    if (state, symbol) in self.Delta:
-                        next_set.update(self.Delta[(state, symbol)])
+        def counters():
+            """ The numbers handed to the progress callback and stored in the budget error. """
+            return {"states": len(new_states), "worklist": len(unprocessed_states), "transitions": len(new_delta)}
 
-                if next_set:
-                    next_set = frozenset(next_set)
-                    formatted_next = format_state(next_set)
+        def check_budgets():
+            """ Raises DeterminizationLimitExceeded (with the partial DFA) once a budget is used up. """
+            reason = None
+            if max_states is not None and len(new_states) > max_states:
+                reason = f"more than {max_states} DFA states"
+            elif max_seconds is not None and time.monotonic() - started > max_seconds:
+                reason = f"more than {max_seconds} seconds"
+            elif max_memory is not None and tracemalloc.get_traced_memory()[0] - memory_before > max_memory:
+                reason = f"more than {max_memory} bytes of memory"
+            if reason is not None:
+                raise DeterminizationLimitExceeded(reason, build_dfa()[0], counters())
 
-                    if next_set not in state_name_map:
-                        state_name_map[next_set] = formatted_next
-                        new_states.add(next_set)
-                        unprocessed_states.append(next_set)
+        track = stats.enabled
+        peak_worklist = 1
+        try:
+            with stats.phase("convert_ndfa_to_dfa.subset_construction"):
+                while unprocessed_states:
+                    current_set = unprocessed_states.pop()
 
-                    new_delta[(formatted_current, symbol)] = {formatted_next}
-                    steps.append((formatted_current, symbol, formatted_next))
+                    for symbol in symbols:
+                        next_set = nfa.step(current_set, symbol)
 
-        for state_set in new_states:
-            if any(s in self.F for s in state_set):
-                new_final_states.add(state_name_map[state_set])
+                        if next_set:
+                            if next_set not in new_states:
+                                new_states.add(next_set)
+                                unprocessed_states.append(next_set)
+                                if track and len(unprocessed_states) > peak_worklist:
+                                    peak_worklist = len(unprocessed_states)
+
+                                check_budgets()
+                                if progress is not None and len(new_states) % progress_every == 0:
+                                    progress(counters())
+
+                            new_delta.append((current_set, symbol, next_set))
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+            # everything below is derived from the final sizes, the loop itself only tracked the worklist peak
+            stats.peak("worklist", peak_worklist)
+            stats.count("dfa_states", len(new_states))
+            stats.count("dfa_transitions", len(new_delta))
+            stats.count("subset_cache_misses", len(new_states) - 1)  # successors that were new DFA states
+            stats.count("subset_cache_hits", len(new_delta) - (len(new_states) - 1))  # ... and known ones
+
+        with stats.phase("convert_ndfa_to_dfa.build_dfa"):
+            dfa, steps = build_dfa()
 
         if visualize:
             vs.visualize_dfa_conversion(steps)
 
-        return FiniteAutomaton(set(state_name_map.values()), self.Sigma, new_delta, "q0", new_final_states)
+        if minimize:
+            with stats.phase("convert_ndfa_to_dfa.minimize"):
+                return dfa.minimize()
+        return dfa
+
+    def reduce_states(self):
+        """ Removes useless states and merges bisimilar ones, returns the reduced NDFA and how many states were removed. """
+        return mn.reduce_nfa(self)
+
+    def minimize(self):
+        """ Returns the minimal DFA (Hopcroft), without unreachable and dead states. """
+        dfa = self if self.is_deterministic() else self.convert_ndfa_to_dfa()
+        return mn.hopcroft_minimize(dfa)
+
+    def compile(self):
+        """ Compiles the automaton into an array-backed DFA for fast membership tests. """
+        # an NDFA is determinized first, so the compiled table always has a single next state
+        dfa = self if self.is_deterministic() else self.convert_ndfa_to_dfa()
+        return ca.CompiledAutomaton.from_dfa(dfa)
+
+    def equivalent(self, other):
+        """ Checks if both automata accept the same language, returns (True, None) or (False, shortest counterexample). """
+        return eq.equivalent(self, other)
+
+    def intersect(self, other):
+        """ Lazy product accepting what both automata accept. """
+        return pa.as_lazy(self).intersect(other)
+
+    def union(self, other):
+        """ Lazy product accepting what at least one of the automata accepts. """
+        return pa.as_lazy(self).union(other)
+
+    def difference(self, other):
+        """ Lazy product accepting what this automaton accepts and the other one does not. """
+        return pa.as_lazy(self).difference(other)
+
+    def complement(self, alphabet=None):
+        """ Lazy automaton accepting every string over the alphabet (Sigma by default) that this one rejects. """
+        return pa.as_lazy(self).complement(alphabet)
+
+    def enumerate_strings(self, limit=None, max_len=None):
+        """ Yields the accepted strings in shortlex order, up to limit strings and/or max_len characters. """
+        return self.compile().iter_language(limit, max_len)
+
+    def lazy_dfa(self, max_states=ld.DEFAULT_MAX_STATES):
+        """ Returns a DFA view that determinizes only the states the input reaches, with a bounded cache. """
+        return ld.LazyDFA(self, max_states)
 
 
 def print_fa(fa, formatted=False):
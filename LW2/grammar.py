@@ -1,42 +1,76 @@
-import random
 import finite_automaton
+import string_counting as sc
+import derivation as dv
+import bulk_generation as bg
+import interning as it
+import instrumentation as ins
 
 class Grammar:
     def __init__(self, V_n, V_t, P, S):
         """ The Constructor of the class. """
-        self.V_n = V_n  # non-terminal symbols
-        self.V_t = V_t  # terminal symbols
-        self.P = P  # the production rules for transformation
+        # symbols and productions are interned into flat arrays, the usual attributes are read-only views
+        self._attach(it.GrammarCore.from_productions(V_n, V_t, P, S), S)
+
+    @classmethod
+    def from_core(cls, core, S):
+        """ Wraps an already built GrammarCore (used by the file loader), nothing is copied. """
+        grammar = cls.__new__(cls)
+        grammar._attach(core, S)
+        return grammar
+
+    def _attach(self, core, S):
+        self.core = core
+        self.V_n = it.FlagSetView(self.core.symbols, self.core.nonterminal)  # non-terminal symbols
+        self.V_t = it.FlagSetView(self.core.symbols, self.core.terminal)  # terminal symbols
+        self.P = it.ProductionsView(self.core)  # the production rules for transformation
         self.S = S  # the start symbol
 
-    def generate_strings(self, num_strings=5, max_conv=10):
+    def generate_strings(self, num_strings=5, max_conv=10, strategy="random"):
         """ Generates a number of strings based on the given Grammar. """
         gen_str = [] # initializing an empty list where we will store the generated words
+        engine = dv.DerivationEngine(self)  # symbols are interned once, each rewrite then costs O(|rhs|)
 
         while len(gen_str) < num_strings:
-            new_string = self.S  # we start with the initial symbol of the grammar
-            steps = 0
-
-            # this loop will continue until there are no non-terminal symbols left
-            while any(symbol in self.V_n for symbol in new_string) and steps < max_conv:
-                # scans the new_string for V_n, collects their position and their symbols
-                possible_replacements = [(i, symbol) for i, symbol in enumerate(new_string) if symbol in self.P]
-
-                if not possible_replacements:
-                    break
-
-                # if there are multiple production rules for a single symbol we pick one randomly
-                i, symbol = random.choice(possible_replacements)
-                new_string = new_string[:i] + random.choice(self.P[symbol]) + new_string[i + 1:]
-                steps += 1
+            # by default a random non-terminal is replaced at every step, like picking a random position
+            new_string = engine.derive(strategy, max_conv)
 
             #if we get to the established lenght of the word and it still contains V_n we discrd it
-            if any(symbol in self.V_n for symbol in new_string):
+            if new_string is None:
                 continue
 
             gen_str.append(new_string)
         return gen_str
 
+    def generate_to_files(self, total, out_dir, shards=None, workers=None, seed=0, max_conv=10,
+                          strategy="random", dedupe=False):
+        """ Bulk mode: generates total strings into sharded files on a process pool, reproducible by seed. """
+        return bg.generate_to_files(self, total, out_dir, shards, workers, seed, max_conv, strategy, dedupe)
+
+    def production_symbols(self, vn):
+        """ The right-hand sides of vn as symbol tuples, straight from the interned core ("ε" is the empty tuple). """
+        core = self.core
+        k = core.lhs_index.get(core.symbols.ids.get(vn))
+        if k is None:
+            return []
+        names = core.symbols.names
+        return [tuple(names[symbol_id] for symbol_id in core.rhs(p)) for p in core.productions_of(k)]
+
+    def count_strings(self, max_length):
+        """ Counts the strings of every length 0..max_length (exact big ints). """
+        # a right-linear grammar is counted on its DFA, any other grammar gets derivation counts,
+        # which are string counts only when the grammar is unambiguous
+        return self._counter().count_strings(max_length)
+
+    def sample_strings(self, length, num_strings=5):
+        """ Draws strings of exactly the given length with no rejections, uniformly from the language if it is right-linear. """
+        counter = self._counter()
+        return [counter.sample(length) for _ in range(num_strings)]
+
+    def _counter(self):
+        if sc.is_right_linear(self):
+            return sc.LanguageCounter(self)
+        return sc.DerivationCounter(self)  # uniform over derivations
+
     def classify_grammar(self):
         """ Classifies the grammar based on Chomsky hierarchy. """
         # this will be our classification flags
@@ -82,63 +116,64 @@ class Grammar:
         else:
             return "Type 0: Unrestricted Grammar"
 
-    def to_finite_automaton(self):
+    def to_finite_automaton(self, stats=None):
         """ Converts Grammar to Finite Automaton. """
+        stats = stats or ins.DISABLED
+        core = self.core
+        names = core.symbols.names
         Q = set()  # set of the states
         Sigma = self.V_t  # the input symbols (the terminals)
-        Delta = {}  # the transition function (production rules)
+        transitions = []  # the transition function (production rules) as (state, symbol, next state)
         F = set()  # the final states
-        state_mapping = {} # maps grammar non-terminals to FA states
+        state_mapping = {} # maps grammar non-terminals (their interned ids) to FA states
 
         # we need to ensure S is always q0
-        state_mapping[self.S] = "q0"
+        start_id = core.symbols.ids[self.S]
+        state_mapping[start_id] = "q0"
         Q.add("q0")
 
         # assigning states to non-terminals
-        state_index = 1
-        for vn in sorted(self.V_n):
-            if vn == self.S:
-                continue # skipping S since it was already assigned
-            state_mapping[vn] = f"q{state_index}"
-            Q.add(state_mapping[vn])
-            state_index += 1
-
-        # track non-terminals that appear in RHS of productions to determine the final states later
-        #if a V_n never appears on the right the its FA state is final
-        appearing_non_terminals = set()
-        for productions in self.P.values():
-            for prod in productions:
-                for symbol in prod:
-                    if symbol in self.V_n:
-                        appearing_non_terminals.add(symbol)
-
-        # defining the transitions
-        for vn, prods in self.P.items():
-            current_state = state_mapping[vn]
-            for prod in prods:
-                first_symbol = prod[0]
-
-                # determine next state
-                if len(prod) == 1 and first_symbol in self.V_t:
-                    next_state = "qf"  # if only a terminal remains, then transition to final state
-                else:
-                    next_non_terminal = prod[1:]  # get next part
-                    next_state = state_mapping.get(next_non_terminal, "qf")
-
-                # creating the transitions and storing them
-                if (current_state, first_symbol) not in Delta:
-                    Delta[(current_state, first_symbol)] = set()
-                Delta[(current_state, first_symbol)].add(next_state)
-
-        # determining the final states
-        for vn, prods in self.P.items():
-            for prod in prods:
-                # If a production directly leads to a terminal (A → d), its FA state is final
-                if len(prod) == 1 and prod in self.V_t:
-                    F.add(state_mapping[vn])
+        with stats.phase("to_finite_automaton.states"):
+            state_index = 1
+            for vn in sorted(self.V_n):
+                if vn == self.S:
+                    continue # skipping S since it was already assigned
+                state_mapping[core.symbols.ids[vn]] = f"q{state_index}"
+                Q.add(f"q{state_index}")
+                state_index += 1
+
+        # defining the transitions, the right-hand sides are symbol id sequences so
+        # multi-character symbols ('q10', 'id', ...) are handled like single characters
+        with stats.phase("to_finite_automaton.transitions"):
+            for k, vn_id in enumerate(core.lhs):
+                current_state = state_mapping[vn_id]
+                for p in core.productions_of(k):
+                    rhs = core.rhs(p)
+                    if not rhs:
+                        transitions.append((current_state, "ε", "qf"))  # A -> ε
+                        continue
+
+                    # determine next state
+                    first_symbol, rest = rhs[0], rhs[1:]
+                    if len(rest) == 1:
+                        next_state = state_mapping.get(rest[0], "qf")  # A -> aB
+                    else:
+                        next_state = "qf"  # if only a terminal remains, then transition to final state
+                        # If a production directly leads to a terminal (A → d), its FA state is final
+                        if not rest and core.terminal[first_symbol]:
+                            F.add(current_state)
+                    transitions.append((current_state, names[first_symbol], next_state))
 
         # ensuring there's at least one final state, but don't adding 'qf' unnecessarily
         if not F:
-            F.add(state_mapping[self.S])  # default to start state only if no other finals exist
+            F.add("q0")  # default to start state only if no other finals exist
+
+        with stats.phase("to_finite_automaton.core"):
+            fa_core = it.AutomatonCore.from_transitions(Q, Sigma, transitions, "q0", F)
+        fa = finite_automaton.FiniteAutomaton.from_core(fa_core, "q0")
 
-        return finite_automaton.FiniteAutomaton(Q, Sigma, Delta, "q0", F)
\ No newline at end of file
+        stats.count("productions", len(core.production_lhs))
+        stats.count("fa_states", len(Q))
+        stats.count("fa_transitions", len(transitions))
+        stats.record_fanout(fa)
+        return fa
@@ -0,0 +1,74 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+NO_PHASE = nullcontext()
+
+
+class Stats:
+    """ Opt-in measurements of one or more automaton operations, pass it as stats= and read it with to_dict(). """
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}  # "operation.phase" -> seconds, summed over repeated calls
+        self.counters = {}  # states and transitions created, cache hits and misses, ...
+        self.peaks = {}  # largest value seen (worklist size, active NFA states)
+        self.fanout = {}  # symbol -> {"sources", "transitions", "max"} of the last automaton recorded
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def peak(self, name, value):
+        if value > self.peaks.get(name, value - 1):
+            self.peaks[name] = value
+
+    def record_fanout(self, fa):
+        """ Per symbol: how many states have edges on it, how many edges in total and the most out of one state. """
+        core = fa.core
+        fanout = {}
+        for state_id in range(len(core.states)):
+            for symbol_id, start, end in core.groups_of(state_id):
+                entry = fanout.setdefault(core.symbols.names[symbol_id], {"sources": 0, "transitions": 0, "max": 0})
+                entry["sources"] += 1
+                entry["transitions"] += end - start
+                entry["max"] = max(entry["max"], end - start)
+        self.fanout = fanout
+
+    def to_dict(self):
+        return {
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "peaks": dict(self.peaks),
+            "fanout": {symbol: dict(entry) for symbol, entry in self.fanout.items()},
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+
+class DisabledStats(Stats):
+    """ What stats=None turns into: every call does nothing, the hot loops check enabled once up front. """
+    enabled = False
+
+    def phase(self, name):
+        return NO_PHASE
+
+    def count(self, name, amount=1):
+        pass
+
+    def peak(self, name, value):
+        pass
+
+    def record_fanout(self, fa):
+        pass
+
+
+DISABLED = DisabledStats()
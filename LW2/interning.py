@@ -0,0 +1,327 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, Set
+
+
+class SymbolTable:
+    """ Interns names (states, symbols) to consecutive small ints. """
+    __slots__ = ("names", "ids", "lengths")
+
+    def __init__(self, names=()):
+        self.names = []  # id -> name
+        self.ids = {}  # name -> id
+        self.lengths = set()  # the distinct name lengths, used for longest-match tokenizing
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = len(self.names)
+            self.ids[name] = symbol_id
+            self.names.append(name)
+            if isinstance(name, str):
+                self.lengths.add(len(name))
+        return symbol_id
+
+    def tokenize(self, text, strict=True):
+        """ Splits text into interned ids, longest name first ('q10' is not read as 'q1' '0'). """
+        lengths = sorted(self.lengths, reverse=True)
+        result = []
+        i = 0
+        while i < len(text):
+            for length in lengths:
+                symbol_id = self.ids.get(text[i:i + length]) if length else None
+                if symbol_id is not None:
+                    break
+            else:
+                if strict:
+                    raise ValueError(f"Unknown symbol at position {i} of '{text}'")
+                length = 1
+                symbol_id = self.intern(text[i])  # lenient mode: an unknown character is its own symbol
+            result.append(symbol_id)
+            i += length
+        return result
+
+    def __len__(self):
+        return len(self.names)
+
+
+class FlagSetView(Set):
+    """ Read-only set of the names whose flag is set, this is what Q, F, Sigma, V_n and V_t look like now. """
+    __slots__ = ("table", "flags")
+
+    def __init__(self, table, flags):
+        self.table = table
+        self.flags = flags  # bytearray, one byte per interned name
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)  # results of |, &, - are plain sets
+
+    def __contains__(self, name):
+        symbol_id = self.table.ids.get(name)
+        return symbol_id is not None and self.flags[symbol_id] == 1
+
+    def __iter__(self):
+        names = self.table.names
+        return (names[i] for i, flag in enumerate(self.flags) if flag)
+
+    def __len__(self):
+        return self.flags.count(1)
+
+    def __repr__(self):
+        return repr(set(self))
+
+
+class AutomatonCore:
+    """ States, symbols and transitions of a FiniteAutomaton stored as flat int arrays (CSR). """
+    __slots__ = ("states", "symbols", "in_q", "final", "in_sigma", "offsets", "edge_symbols", "edge_targets", "groups")
+
+    def __init__(self, Q, Sigma, Delta, q0, F):
+        transitions = ((state, symbol, next_state)
+                       for (state, symbol), next_states in Delta.items() for next_state in next_states)
+        self._build(Q, Sigma, transitions, q0, F)
+
+    @classmethod
+    def from_transitions(cls, Q, Sigma, transitions, q0, F):
+        """ Builds the core straight from (state, symbol, next state) triples, no Delta dict is needed. """
+        core = cls.__new__(cls)
+        core._build(Q, Sigma, transitions, q0, F)
+        return core
+
+    def _build(self, Q, Sigma, transitions, q0, F):
+        self.states = SymbolTable()
+        self.symbols = SymbolTable()
+
+        triples = []
+        for state, symbol, next_state in transitions:
+            triples.append((self.states.intern(state), self.symbols.intern(symbol), self.states.intern(next_state)))
+        for state in Q:
+            self.states.intern(state)
+        for state in F:
+            self.states.intern(state)
+        self.states.intern(q0)
+        for symbol in Sigma:
+            self.symbols.intern(symbol)
+
+        # one byte per state/symbol remembers if it belongs to Q, F and Sigma
+        self.in_q = bytearray(len(self.states))
+        self.final = bytearray(len(self.states))
+        self.in_sigma = bytearray(len(self.symbols))
+        for state in Q:
+            self.in_q[self.states.ids[state]] = 1
+        for state in F:
+            self.final[self.states.ids[state]] = 1
+        for symbol in Sigma:
+            self.in_sigma[self.symbols.ids[symbol]] = 1
+
+        # CSR: the edges of state s are offsets[s]..offsets[s+1], sorted by symbol then target
+        triples = sorted(set(triples))
+        self.offsets = array('i', [0]) * (len(self.states) + 1)
+        for state_id, _, _ in triples:
+            self.offsets[state_id + 1] += 1
+        for s in range(len(self.states)):
+            self.offsets[s + 1] += self.offsets[s]
+        self.edge_symbols = array('i', (symbol_id for _, symbol_id, _ in triples))
+        self.edge_targets = array('i', (target_id for _, _, target_id in triples))
+        self.groups = len({(state_id, symbol_id) for state_id, symbol_id, _ in triples})  # number of Delta keys
+
+    def targets(self, state_id, symbol_id):
+        """ Slice bounds of the targets of (state, symbol), found by binary search inside the row. """
+        lo, hi = self.offsets[state_id], self.offsets[state_id + 1]
+        return bisect_left(self.edge_symbols, symbol_id, lo, hi), bisect_right(self.edge_symbols, symbol_id, lo, hi)
+
+    def groups_of(self, state_id):
+        """ Yields (symbol_id, start, end) for every symbol that has edges out of the state. """
+        i, hi = self.offsets[state_id], self.offsets[state_id + 1]
+        while i < hi:
+            symbol_id = self.edge_symbols[i]
+            end = bisect_right(self.edge_symbols, symbol_id, i, hi)
+            yield symbol_id, i, end
+            i = end
+
+
+class DeltaView(Mapping):
+    """ Read-only {(state, symbol): set of next states} view over the CSR arrays. """
+    __slots__ = ("core",)
+
+    def __init__(self, core):
+        self.core = core
+
+    def _bounds(self, key):
+        try:
+            state, symbol = key
+        except (TypeError, ValueError):
+            return None
+        state_id, symbol_id = self.core.states.ids.get(state), self.core.symbols.ids.get(symbol)
+        if state_id is None or symbol_id is None:
+            return None
+        start, end = self.core.targets(state_id, symbol_id)
+        return (start, end) if start < end else None
+
+    def __getitem__(self, key):
+        bounds = self._bounds(key)
+        if bounds is None:
+            raise KeyError(key)
+        names = self.core.states.names
+        return {names[target_id] for target_id in self.core.edge_targets[bounds[0]:bounds[1]]}
+
+    def __contains__(self, key):
+        return self._bounds(key) is not None
+
+    def __iter__(self):
+        states, symbols = self.core.states.names, self.core.symbols.names
+        for state_id in range(len(states)):
+            for symbol_id, _, _ in self.core.groups_of(state_id):
+                yield states[state_id], symbols[symbol_id]
+
+    def items(self):
+        return DeltaItemsView(self)
+
+    def __len__(self):
+        return self.core.groups
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class DeltaItemsView:
+    """ items() of a DeltaView, walks the arrays once instead of looking every key up again. """
+    __slots__ = ("view",)
+
+    def __init__(self, view):
+        self.view = view
+
+    def __iter__(self):
+        core = self.view.core
+        states, symbols = core.states.names, core.symbols.names
+        for state_id in range(len(states)):
+            for symbol_id, start, end in core.groups_of(state_id):
+                yield (states[state_id], symbols[symbol_id]), {states[t] for t in core.edge_targets[start:end]}
+
+    def __len__(self):
+        return len(self.view)
+
+
+class GrammarCore:
+    """ Symbols and productions of a Grammar, right-hand sides stored as interned ids in flat arrays. """
+    __slots__ = ("symbols", "nonterminal", "terminal", "lhs", "lhs_index", "production_lhs",
+                 "production_offsets", "productions", "rhs_offsets", "rhs_symbols")
+
+    def __init__(self):
+        self.symbols = SymbolTable()
+        self.lhs = array('i')  # symbol ids of the left-hand sides, in the order they first showed up
+        self.lhs_index = {}  # symbol id -> position in lhs
+
+        # productions in arrival order: production p belongs to lhs[production_lhs[p]] and its
+        # right-hand side is rhs_symbols[rhs_offsets[p]:rhs_offsets[p + 1]] (empty for ε)
+        self.production_lhs = array('i')
+        self.rhs_offsets = array('i', [0])
+        self.rhs_symbols = array('i')
+
+        # filled by finish(): the productions of lhs[k] are productions[production_offsets[k]:production_offsets[k + 1]]
+        self.production_offsets = None
+        self.productions = None
+        self.nonterminal = None
+        self.terminal = None
+
+    @classmethod
+    def from_productions(cls, V_n, V_t, P, S):
+        """ Builds the core from the usual {lhs: [rhs strings]} dict. """
+        core = cls()
+        for symbol in sorted(V_n, key=str):
+            core.symbols.intern(symbol)
+        for symbol in sorted(V_t, key=str):
+            core.symbols.intern(symbol)
+        core.symbols.intern(S)
+
+        for left, rhs_list in P.items():
+            core.add_lhs(left)
+            for rhs in rhs_list:
+                core.add_production(left, [] if rhs == "ε" else core.symbols.tokenize(rhs, strict=False))
+        core.finish(V_n, V_t)
+        return core
+
+    def add_lhs(self, left):
+        """ Registers a left-hand side (also one without productions), returns its position. """
+        symbol_id = self.symbols.intern(left)
+        k = self.lhs_index.get(symbol_id)
+        if k is None:
+            k = self.lhs_index[symbol_id] = len(self.lhs)
+            self.lhs.append(symbol_id)
+        return k
+
+    def add_production(self, left, rhs_ids):
+        """ Appends one production, the right-hand side is a sequence of already interned ids. """
+        self.production_lhs.append(self.add_lhs(left))
+        self.rhs_symbols.extend(rhs_ids)
+        self.rhs_offsets.append(len(self.rhs_symbols))
+
+    def finish(self, V_n=None, V_t=None):
+        """ Groups the productions by left-hand side (counting sort) and sets the symbol flags. """
+        self.production_offsets = array('i', [0]) * (len(self.lhs) + 1)
+        for k in self.production_lhs:
+            self.production_offsets[k + 1] += 1
+        for k in range(len(self.lhs)):
+            self.production_offsets[k + 1] += self.production_offsets[k]
+        self.productions = array('i', [0]) * len(self.production_lhs)
+        fill = array('i', self.production_offsets[:-1])
+        for p, k in enumerate(self.production_lhs):
+            self.productions[fill[k]] = p
+            fill[k] += 1
+
+        # without explicit sets every left-hand side is a non-terminal and every other symbol a terminal
+        self.nonterminal = bytearray(len(self.symbols))
+        self.terminal = bytearray(len(self.symbols))
+        if V_n is None:
+            for symbol_id in self.lhs:
+                self.nonterminal[symbol_id] = 1
+        else:
+            for symbol in V_n:
+                self.nonterminal[self.symbols.ids[symbol]] = 1
+        if V_t is None:
+            for symbol_id in self.rhs_symbols:
+                if not self.nonterminal[symbol_id]:
+                    self.terminal[symbol_id] = 1
+        else:
+            for symbol in V_t:
+                self.terminal[self.symbols.ids[symbol]] = 1
+
+    def rhs(self, p):
+        """ The right-hand side of production p as a tuple of symbol ids. """
+        return tuple(self.rhs_symbols[self.rhs_offsets[p]:self.rhs_offsets[p + 1]])
+
+    def productions_of(self, k):
+        """ Production numbers of the k-th left-hand side. """
+        return self.productions[self.production_offsets[k]:self.production_offsets[k + 1]]
+
+    def rhs_text(self, p):
+        """ The right-hand side of production p as the original string. """
+        names = self.symbols.names
+        symbols = self.rhs(p)
+        return "".join(names[symbol_id] for symbol_id in symbols) if symbols else "ε"
+
+
+class ProductionsView(Mapping):
+    """ Read-only {lhs: [rhs strings]} view of the productions, this is what P looks like now. """
+    __slots__ = ("core", "index")
+
+    def __init__(self, core):
+        self.core = core
+        self.index = {core.symbols.names[symbol_id]: k for k, symbol_id in enumerate(core.lhs)}
+
+    def __getitem__(self, left):
+        return [self.core.rhs_text(p) for p in self.core.productions_of(self.index[left])]
+
+    def __contains__(self, left):
+        return left in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
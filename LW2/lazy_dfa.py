@@ -0,0 +1,88 @@
+DEFAULT_MAX_STATES = 10000
+MIN_PROGRESS = 10  # symbols per cache slot that a flush has to be worth, like RE2's bytes per state
+MAX_POOR_FLUSHES = 3  # after this many poor flushes in a row accepts() steps the NDFA directly
+
+
+class LazyDFA:
+    def __init__(self, fa, max_states=DEFAULT_MAX_STATES):
+        """ The Constructor of the class. """
+        if max_states < 1:
+            raise ValueError("max_states must be at least 1")
+        self.nfa = fa.bitset()  # the NDFA that is determinized on the fly, in bitset form
+        self.max_states = max_states  # upper bound for the number of cached DFA states
+        self.start = self.nfa.start
+        self.dead = 0  # the empty set of NFA states behaves as the dead state
+
+        # DFA state (a bitset of NFA states) -> [is_final, {symbol: next DFA state}]
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    def _entry(self, state_set):
+        """ Returns the cache entry of a DFA state, creating it (and flushing the cache when full) if needed. """
+        entry = self.cache.get(state_set)
+        if entry is not None:
+            return entry
+
+        # a full cache is dropped as a whole (like RE2) instead of evicting one state at a time,
+        # which thrashes as soon as the working set is larger than max_states
+        if len(self.cache) >= self.max_states:
+            self.flush()
+            self.flushes += 1
+
+        entry = [self.nfa.is_final(state_set), {}]
+        self.cache[state_set] = entry
+        return entry
+
+    def step(self, state_set, symbol):
+        """ Returns the DFA state reached from state_set on symbol, computing it only the first time. """
+        transitions = self._entry(state_set)[1]
+        next_set = transitions.get(symbol)
+        if next_set is not None:
+            self.hits += 1
+            return next_set
+
+        # cache miss: this is the only place where the subset construction actually happens
+        self.misses += 1
+        next_set = self.nfa.step(state_set, symbol)
+        transitions[symbol] = next_set
+        return next_set
+
+    def is_final(self, state_set):
+        """ Checks if the DFA state contains a final state of the NDFA. """
+        return self._entry(state_set)[0]
+
+    def accepts(self, str_input):
+        """ Checks membership, building only the DFA states the input really reaches. """
+        state_set = self.start
+        flushes = self.flushes
+        last_flush = 0  # position of the last flush
+        poor_flushes = 0
+        for position, k in enumerate(str_input):
+            state_set = self.step(state_set, k)
+            if state_set == self.dead:
+                return False
+
+            if self.flushes != flushes:
+                # a flush that came after fewer than MIN_PROGRESS symbols per cached state didn't pay off,
+                # after a few of those in a row the rest of the input goes through the NDFA directly
+                poor = position - last_flush < MIN_PROGRESS * self.max_states
+                poor_flushes = poor_flushes + 1 if poor else 0
+                flushes = self.flushes
+                last_flush = position
+                if poor_flushes >= MAX_POOR_FLUSHES:
+                    return self._simulate(state_set, str_input[position + 1:])
+        return self.is_final(state_set)
+
+    def _simulate(self, state_set, rest):
+        """ Steps the bitset NDFA without caching, for inputs whose DFA states don't fit into the cache. """
+        for k in rest:
+            state_set = self.nfa.step(state_set, k)
+            if state_set == self.dead:
+                return False
+        return self.nfa.is_final(state_set)
+
+    def flush(self):
+        """ Drops every cached DFA state, they are rebuilt on demand afterwards. """
+        self.cache.clear()
@@ -0,0 +1,179 @@
+import json
+import os
+import re
+
+import epsilon_closure as ec
+import finite_automaton
+import grammar as gr
+import interning as it
+
+ARROWS = ("->", "→", "::=")
+ALTERNATIVE = "|"
+COMMENT = "#"
+
+DOT_ID = r'"(?:[^"\\]|\\.)*"|[^\s\[\];"=-]+'
+DOT_EDGE = re.compile(rf"^\s*({DOT_ID})\s*->\s*({DOT_ID})\s*(?:\[(.*)\])?\s*;?\s*$")
+DOT_NODE = re.compile(rf"^\s*({DOT_ID})\s*(?:\[(.*)\])?\s*;?\s*$")
+DOT_ATTRIBUTE = re.compile(rf"(\w+)\s*=\s*({DOT_ID})")
+DOT_KEYWORDS = {"digraph", "graph", "node", "edge", "subgraph", "{", "}"}
+
+
+def load_grammar(path, start=None):
+    """ Streams a production-list file into a Grammar, one line at a time. """
+    # format: 'A -> a B | c' (also '::=' or '→'), symbols separated by whitespace so they can be
+    # longer than one character, 'ε' or an empty alternative is the empty string, a line starting
+    # with '|' continues the previous left-hand side and lines starting with '#' are comments.
+    # Every left-hand side is a non-terminal, every other symbol a terminal, S is the first
+    # left-hand side unless start is given.
+    core = it.GrammarCore()
+    intern = core.symbols.intern
+    left = None
+
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            tokens = line.split()
+            if not tokens or tokens[0].startswith(COMMENT):
+                continue
+
+            if tokens[0] == ALTERNATIVE:
+                if left is None:
+                    raise ValueError(f"{path}:{line_no}: '|' before any production")
+                rest = tokens[1:]
+            elif len(tokens) >= 2 and tokens[1] in ARROWS:
+                left = tokens[0]
+                rest = tokens[2:]
+            else:
+                raise ValueError(f"{path}:{line_no}: expected 'A -> ...', got '{line.strip()}'")
+
+            if start is None:
+                start = left
+            core.add_lhs(left)
+
+            # every alternative goes into the core as soon as it is read, ids instead of strings
+            rhs = []
+            for token in rest:
+                if token == ALTERNATIVE:
+                    core.add_production(left, rhs)
+                    rhs = []
+                elif token != ec.EPSILON:
+                    rhs.append(intern(token))
+            core.add_production(left, rhs)
+
+    if start is None:
+        raise ValueError(f"{path}: no productions")
+    core.finish()
+    if start not in core.symbols.ids or not core.nonterminal[core.symbols.ids[start]]:
+        raise ValueError(f"{path}: start symbol '{start}' has no productions")
+    return gr.Grammar.from_core(core, start)
+
+
+def load_automaton(path):
+    """ Loads a FiniteAutomaton from a JSON file or a Graphviz file (like the extensionless ones visualization writes). """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        return load_automaton_json(path)
+    if extension in (".dot", ".gv"):
+        return load_automaton_dot(path)
+
+    # anything else is recognised by its first non-blank character: '{' is JSON, 'digraph' is DOT
+    with open(path, encoding="utf-8") as f:
+        head = f.read(256).lstrip()
+    if head.startswith("{"):
+        return load_automaton_json(path)
+    if head.split(None, 1)[:1] in (["digraph"], ["strict"]):
+        return load_automaton_dot(path)
+    raise ValueError(f"Unknown automaton file type: {path}")
+
+
+def load_automaton_json(path):
+    """ Reads {"start", "final", "transitions": [[state, symbol, next state], ...], "states"?, "alphabet"?}. """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    try:
+        start, final, transitions = data["start"], data["final"], data["transitions"]
+    except KeyError as error:
+        raise ValueError(f"{path}: missing key {error}") from None
+
+    # states and alphabet are optional, by default they are the ones the transitions use
+    states = data.get("states")
+    if states is None:
+        states = _endpoints(transitions, start, final)
+    alphabet = data.get("alphabet")
+    if alphabet is None:
+        alphabet = {symbol for _, symbol, _ in transitions} - {ec.EPSILON}
+    core = it.AutomatonCore.from_transitions(states, alphabet, transitions, start, final)
+    return finite_automaton.FiniteAutomaton.from_core(core, start)
+
+
+def load_automaton_dot(path):
+    """ Streams a Graphviz file: doublecircle nodes are final, the edge out of a shape=none node marks q0. """
+    states = []
+    final = []
+    hidden = set()  # the invisible 'start' node and friends
+    edges = []
+    start = None
+
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            stripped = line.strip()
+            if not stripped or stripped.split(None, 1)[0] in DOT_KEYWORDS or stripped.startswith("//"):
+                continue
+
+            match = DOT_EDGE.match(line)
+            if match:
+                source, target = _dot_id(match.group(1)), _dot_id(match.group(2))
+                attributes = _dot_attributes(match.group(3))
+                label = attributes.get("label")
+                if source in hidden:
+                    if start is not None:
+                        raise ValueError(f"{path}:{line_no}: second start edge")
+                    start = target
+                    continue
+                if label is None:
+                    raise ValueError(f"{path}:{line_no}: transition without a label")
+                # 'a,b' is a shorthand for two parallel edges
+                for symbol in (label.split(",") if label != "," else [label]):
+                    edges.append((source, symbol.strip(), target))
+                continue
+
+            match = DOT_NODE.match(line)
+            if match:
+                name = _dot_id(match.group(1))
+                attributes = _dot_attributes(match.group(2))
+                if attributes.get("shape") in ("none", "point", "plaintext"):
+                    hidden.add(name)
+                    continue
+                states.append(name)
+                if attributes.get("shape") == "doublecircle":
+                    final.append(name)
+                continue
+            # graph attributes such as 'rankdir=LR size=10' are skipped
+
+    if start is None:
+        raise ValueError(f"{path}: no start edge")
+    states = _endpoints(edges, start, final).union(states)
+    alphabet = {symbol for _, symbol, _ in edges} - {ec.EPSILON}
+    core = it.AutomatonCore.from_transitions(states, alphabet, edges, start, final)
+    return finite_automaton.FiniteAutomaton.from_core(core, start)
+
+
+def _endpoints(transitions, start, final):
+    """ Every state named by the transitions, the start state or the final states. """
+    states = {start}
+    states.update(final)
+    for state, _, next_state in transitions:
+        states.add(state)
+        states.add(next_state)
+    return states
+
+
+def _dot_id(token):
+    if token.startswith('"'):
+        return token[1:-1].replace('\\"', '"')
+    return token
+
+
+def _dot_attributes(text):
+    if not text:
+        return {}
+    return {key: _dot_id(value) for key, value in DOT_ATTRIBUTE.findall(text)}
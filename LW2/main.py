@@ -1,5 +1,6 @@
 from finite_automaton import FiniteAutomaton, print_fa
 from grammar import Grammar
+from automaton_cache import cached_compile
 import visualization as vs
 
 class Main:
@@ -61,12 +62,17 @@ class Main:
         print("\nFA Deterministic Check:")
         print("Deterministic" if finite_automaton.is_deterministic() else "Non-Deterministic")
 
-        # 8. Convert NDFA to DFA
-        dfa = finite_automaton.convert_ndfa_to_dfa()
+        # 8. Convert NDFA to DFA (the compiled DFA is cached on disk, so later runs skip the conversion)
+        dfa = cached_compile(finite_automaton).to_finite_automaton()
         print("\nConverted DFA:")
         print_fa(dfa, formatted=True)
 
-        # 9. Generate Visualizations
+        # 9. Check that the conversion kept the language
+        same, counterexample = finite_automaton.equivalent(dfa)
+        print("\nNDFA and DFA equivalence check:")
+        print("Equivalent" if same else f"Not equivalent, counterexample: '{counterexample}'")
+
+        # 10. Generate Visualizations
         vs.visualize_fa(finite_automaton, "finite_automaton")
         vs.visualize_fa(dfa, "converted_dfa")
 
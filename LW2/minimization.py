@@ -0,0 +1,265 @@
+from collections import deque
+
+
+def reachable_states(fa):
+    """ Collects the states reachable from the initial state (BFS over Delta). """
+    successors = {}
+    for (state, symbol), next_states in fa.Delta.items():
+        successors.setdefault(state, set()).update(next_states)
+
+    seen = {fa.q0}
+    queue = deque([fa.q0])
+    while queue:
+        state = queue.popleft()
+        for next_state in successors.get(state, ()):
+            if next_state not in seen:
+                seen.add(next_state)
+                queue.append(next_state)
+    return seen
+
+
+def hopcroft_minimize(dfa):
+    """ Minimizes a DFA with Hopcroft's partition refinement, unreachable and dead states are dropped. """
+    # the states are numbered, the extra last number is a sink that completes the partial DFA
+    states = sorted(reachable_states(dfa), key=str)
+    index = {state: i for i, state in enumerate(states)}
+    sink = len(states)
+    symbols = sorted(set(dfa.Sigma) | {symbol for (_, symbol) in dfa.Delta}, key=str)
+    symbol_index = {symbol: c for c, symbol in enumerate(symbols)}
+
+    delta = [[sink] * len(symbols) for _ in range(sink + 1)]
+    for (state, symbol), next_states in dfa.Delta.items():
+        if state in index:
+            for next_state in next_states:
+                delta[index[state]][symbol_index[symbol]] = index[next_state]
+
+    # inverse[c][q] lists the states that go to q on the c-th symbol
+    inverse = [[[] for _ in range(sink + 1)] for _ in symbols]
+    for q in range(sink + 1):
+        for c, target in enumerate(delta[q]):
+            inverse[c][target].append(q)
+
+    # initial partition: final states vs everything else (the sink is never final)
+    finals = {index[state] for state in dfa.F if state in index}
+    others = set(range(sink + 1)) - finals
+    blocks = [set(block) for block in (finals, others) if block]  # copies, blocks are split in place
+    block_of = [0] * (sink + 1)
+    for b, block in enumerate(blocks):
+        for q in block:
+            block_of[q] = b
+
+    # it is enough to start from the smaller of the two blocks
+    worklist = {min(range(len(blocks)), key=lambda b: len(blocks[b]))}
+
+    while worklist:
+        splitter = set(blocks[worklist.pop()])
+        for c in range(len(symbols)):
+            # X = the states that enter the splitter on symbol c, grouped by their current block
+            touched = {}
+            for q in splitter:
+                for p in inverse[c][q]:
+                    touched.setdefault(block_of[p], set()).add(p)
+
+            for b, inside in touched.items():
+                block = blocks[b]
+                if len(inside) == len(block):
+                    continue  # the whole block goes into the splitter, nothing to split
+
+                # the smaller half gets the new block id, so relabeling stays O(n log n) overall; the
+                # split itself only costs the smaller half too (block - inside would cost the whole block)
+                if 2 * len(inside) <= len(block):
+                    block.difference_update(inside)
+                    small = inside
+                else:
+                    small = block - inside
+                    blocks[b] = inside
+                blocks.append(small)
+                new_block = len(blocks) - 1
+                for q in small:
+                    block_of[q] = new_block
+
+                # if b is still waiting in the worklist both halves are now in it, otherwise
+                # adding only the smaller half is enough (Hopcroft's trick)
+                worklist.add(new_block)
+
+    # the block holding the sink contains every dead state, it is dropped from the result
+    dead_block = block_of[sink]
+
+    def block_name(b):
+        """ Uses one of the original names, the initial state keeps its own name. """
+        block = blocks[b]
+        if index[dfa.q0] in block:
+            return dfa.q0
+        return min((states[q] for q in block), key=str)
+
+    names = {b: block_name(b) for b in range(len(blocks)) if b != dead_block}
+
+    new_delta = {}
+    for b, name in names.items():
+        representative = next(iter(blocks[b]))
+        for c, symbol in enumerate(symbols):
+            target = block_of[delta[representative][c]]
+            if target != dead_block:
+                new_delta[(name, symbol)] = {names[target]}
+
+    new_final_states = {names[block_of[q]] for q in finals}
+    if not names:
+        names = {dead_block: dfa.q0}  # empty language: only the initial state is left
+
+    return type(dfa)(set(names.values()), dfa.Sigma, new_delta, dfa.q0, new_final_states)
+
+
+def useful_states(fa):
+    """ States that are reachable from q0 and can still reach a final state (q0 is always kept). """
+    predecessors = {}
+    for (state, symbol), next_states in fa.Delta.items():
+        for next_state in next_states:
+            predecessors.setdefault(next_state, set()).add(state)
+
+    # backward BFS from the final states gives the co-reachable ones
+    reachable = reachable_states(fa)
+    coreachable = {state for state in fa.F if state in reachable}
+    queue = deque(coreachable)
+    while queue:
+        state = queue.popleft()
+        for previous in predecessors.get(state, ()):
+            if previous not in coreachable:
+                coreachable.add(previous)
+                queue.append(previous)
+
+    return (reachable & coreachable) | {fa.q0}
+
+
+def bisimulation_blocks(n, initial_key, edges, reverse):
+    """ Coarsest partition of 0..n-1 that refines initial_key and whose states agree on the blocks of their edges. """
+    # edges[i] holds the (symbol, j) pairs of state i, reverse[j] the states with an edge into j.
+    # Only the predecessors of states that changed block can get a new signature, so only they are
+    # re-examined (against one untouched member of their block) instead of every state each round
+    numbering = {}
+    block_of = [numbering.setdefault(initial_key(i), len(numbering)) for i in range(n)]
+    blocks = [set() for _ in numbering]
+    for i, b in enumerate(block_of):
+        blocks[b].add(i)
+    pending = {b: set(block) for b, block in enumerate(blocks)}  # block -> states to re-examine
+
+    def signature(i):
+        return frozenset((symbol, block_of[j]) for symbol, j in edges[i])
+
+    while pending:
+        b, touched = pending.popitem()
+        block = blocks[b]
+        groups = {}
+        for i in touched:
+            groups.setdefault(signature(i), []).append(i)
+
+        # the untouched states still share one signature, the touched ones that match it stay,
+        # without untouched states the largest group keeps the block id
+        untouched = next((i for i in block if i not in touched), None)
+        if untouched is not None:
+            staying = signature(untouched)
+        else:
+            staying = max(groups, key=lambda key: len(groups[key]))
+
+        moved = []
+        for key, group in groups.items():
+            if key == staying:
+                continue
+            blocks.append(set(group))
+            block.difference_update(group)
+            for i in group:
+                block_of[i] = len(blocks) - 1
+            moved.extend(group)
+
+        for i in moved:
+            for j in reverse[i]:
+                pending.setdefault(block_of[j], set()).add(j)
+
+    return block_of
+
+
+def merge_blocks(fa, states, block_of):
+    """ Builds the quotient automaton, one state per block. """
+    members = {}
+    for state in sorted(states, key=str):
+        members.setdefault(block_of[state], []).append(state)
+    # the block of q0 keeps the name q0, the others take their smallest name
+    name = {block: fa.q0 if fa.q0 in group else group[0] for block, group in members.items()}
+    rename = {state: name[block_of[state]] for state in states}
+
+    new_delta = {}
+    for (state, symbol), next_states in fa.Delta.items():
+        if state not in rename:
+            continue
+        targets = {rename[next_state] for next_state in next_states if next_state in rename}
+        if targets:
+            new_delta.setdefault((rename[state], symbol), set()).update(targets)
+
+    new_final_states = {rename[state] for state in fa.F if state in rename}
+    return type(fa)(set(name.values()), fa.Sigma, new_delta, fa.q0, new_final_states)
+
+
+def quotient(edges, final, block_of):
+    """ The edges and finality of the blocks, a block is final if one of its states is. """
+    count = max(block_of) + 1
+    new_edges = [set() for _ in range(count)]
+    new_final = [False] * count
+    for i, out in enumerate(edges):
+        b = block_of[i]
+        new_edges[b].update((symbol, block_of[j]) for symbol, j in out)
+        new_final[b] = new_final[b] or final[i]
+    return new_edges, new_final
+
+
+def reduce_nfa(fa):
+    """ Shrinks an NFA before determinization, returns the reduced NFA and the number of removed states. """
+    original = set(fa.Q) | {fa.q0}
+
+    # 1. dropping the states that can't be reached or can't reach a final state, the rest is numbered
+    states = sorted(useful_states(fa), key=str)
+    index = {state: i for i, state in enumerate(states)}
+    edges = [set() for _ in states]
+    for (state, symbol), next_states in fa.Delta.items():
+        if state in index:
+            edges[index[state]].update((symbol, index[next_state]) for next_state in next_states if next_state in index)
+    final = [False] * len(states)
+    for state in fa.F:
+        if state in index:
+            final[index[state]] = True
+    initial = index[fa.q0]
+    block_of = list(range(len(states)))  # original number -> current block
+
+    # 2. merging forward bisimilar states (same finality, same successor blocks) and backward
+    # bisimilar ones (same initiality, same predecessor blocks), both keep the language; the rounds
+    # work on numbered blocks and the automaton is only built once at the end
+    while True:
+        size = len(edges)
+
+        predecessors = [[] for _ in edges]
+        for i, out in enumerate(edges):
+            for _, j in out:
+                predecessors[j].append(i)
+        forward = bisimulation_blocks(len(edges), final.__getitem__, edges, predecessors)
+        edges, final = quotient(edges, final, forward)
+        initial = forward[initial]
+        block_of = [forward[b] for b in block_of]
+
+        # backward bisimulation is the forward one on the reversed edges
+        reversed_edges = [set() for _ in edges]
+        for i, out in enumerate(edges):
+            for symbol, j in out:
+                reversed_edges[j].add((symbol, i))
+        successors = [[j for _, j in out] for out in edges]
+        backward = bisimulation_blocks(len(edges), initial.__eq__, reversed_edges, successors)
+        edges, final = quotient(edges, final, backward)
+        initial = backward[initial]
+        block_of = [backward[b] for b in block_of]
+
+        if len(edges) == size:
+            break  # another round would not merge anything anymore
+
+    reduced = merge_blocks(fa, states, {state: block_of[index[state]] for state in states})
+    # removed = states of Q the trim dropped + states the bisimulation merged away, transition
+    # targets outside Q (like the 'qf' sink of a grammar automaton) were never states to remove
+    trimmed = len(original - set(states))
+    merged = len(states) - len(set(block_of))
+    return reduced, trimmed + merged
@@ -0,0 +1,141 @@
+from collections import deque
+
+import epsilon_closure as ec
+import finite_automaton
+
+
+class LazyAutomaton:
+    """ A DFA given only by start, step and is_final, its states are built when they are reached. """
+    symbols = ()
+
+    def accepts(self, str_input):
+        alphabet = set(self.symbols)
+        state = self.start
+        for k in str_input:
+            if k not in alphabet:
+                return False  # matters for complements, the other ones would end in a dead state anyway
+            state = self.step(state, k)
+        return self.is_final(state)
+
+    def witness(self):
+        """ Shortest accepted string (BFS, stops at the first final state), None if the language is empty. """
+        came_from = {self.start: None}  # state -> (previous state, symbol)
+        queue = deque([self.start])
+        while queue:
+            state = queue.popleft()
+            if self.is_final(state):
+                word = []
+                while came_from[state] is not None:
+                    state, symbol = came_from[state]
+                    word.append(symbol)
+                return "".join(reversed(word))
+
+            for symbol in self.symbols:
+                next_state = self.step(state, symbol)
+                if next_state not in came_from:
+                    came_from[next_state] = (state, symbol)
+                    queue.append(next_state)
+        return None
+
+    def is_empty(self):
+        return self.witness() is None
+
+    def materialize(self):
+        """ Builds a complete FiniteAutomaton from the reachable states only. """
+        names = {self.start: "q0"}
+        queue = deque([self.start])
+        Delta = {}
+        while queue:
+            state = queue.popleft()
+            for symbol in self.symbols:
+                next_state = self.step(state, symbol)
+                if next_state not in names:
+                    names[next_state] = f"q{len(names)}"
+                    queue.append(next_state)
+                Delta[(names[state], symbol)] = {names[next_state]}
+
+        F = {name for state, name in names.items() if self.is_final(state)}
+        return finite_automaton.FiniteAutomaton(set(names.values()), set(self.symbols), Delta, "q0", F)
+
+    def compile(self):
+        return self.materialize().compile()
+
+    def intersect(self, other):
+        return ProductAutomaton(self, as_lazy(other), "intersection")
+
+    def union(self, other):
+        return ProductAutomaton(self, as_lazy(other), "union")
+
+    def difference(self, other):
+        return ProductAutomaton(self, as_lazy(other), "difference")
+
+    def complement(self, alphabet=None):
+        return ComplementAutomaton(self, alphabet)
+
+
+class AutomatonView(LazyAutomaton):
+    """ A FiniteAutomaton seen as a lazy DFA, its states are the bitsets of the subset construction. """
+    def __init__(self, fa):
+        self.nfa = fa.bitset()
+        symbols = set(fa.Sigma) | {symbol for (_, symbol) in fa.Delta}
+        self.symbols = sorted(symbols - {ec.EPSILON}, key=str)
+        self.start = self.nfa.start
+
+    def step(self, state, symbol):
+        return self.nfa.step(state, symbol)  # the empty bitset 0 is the dead state
+
+    def is_final(self, state):
+        return self.nfa.is_final(state)
+
+
+class ProductAutomaton(LazyAutomaton):
+    """ Pairs of states of two lazy DFAs, only the pairs the input reaches are ever created. """
+    OPERATIONS = {
+        "intersection": lambda left, right: left and right,
+        "union": lambda left, right: left or right,
+        "difference": lambda left, right: left and not right,
+    }
+
+    def __init__(self, left, right, operation):
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown product operation: {operation}")
+        self.left = left
+        self.right = right
+        self.operation = operation
+        self.final = self.OPERATIONS[operation]
+        self.symbols = sorted(set(left.symbols) | set(right.symbols), key=str)
+        self.start = (left.start, right.start)
+
+    def step(self, state, symbol):
+        return self.left.step(state[0], symbol), self.right.step(state[1], symbol)
+
+    def is_final(self, state):
+        return self.final(self.left.is_final(state[0]), self.right.is_final(state[1]))
+
+
+SINK = object()  # state of a complement after a symbol outside its alphabet, never final
+
+
+class ComplementAutomaton(LazyAutomaton):
+    """ Same states as the inner lazy DFA (whose dead state is a real state), finality flipped. """
+    def __init__(self, inner, alphabet=None):
+        self.inner = inner
+        self.symbols = sorted(alphabet, key=str) if alphabet is not None else list(inner.symbols)
+        self.alphabet = set(self.symbols)
+        self.start = inner.start
+
+    def step(self, state, symbol):
+        # the inner dead state would turn final here, so foreign symbols go to a sink of their own
+        if state is SINK or symbol not in self.alphabet:
+            return SINK
+        return self.inner.step(state, symbol)
+
+    def is_final(self, state):
+        return state is not SINK and not self.inner.is_final(state)
+
+
+def as_lazy(automaton):
+    """ Wraps a FiniteAutomaton, lazy automata are returned as they are. """
+    if isinstance(automaton, LazyAutomaton):
+        return automaton
+    return AutomatonView(automaton)
@@ -0,0 +1,185 @@
+import random
+
+import epsilon_closure as ec
+import finite_automaton
+
+IN_PROGRESS = -1  # marks a (non-terminal, length) count that is still being computed
+
+
+class DerivationCounter:
+    """ Counts and samples derivations, these are strings only when the grammar is unambiguous. """
+    def __init__(self, grammar):
+        """ The Constructor of the class. """
+        self.grammar = grammar
+        # productions split into symbol tuples once, "ε" becomes the empty tuple
+        self.productions = {vn: grammar.production_symbols(vn) for vn in grammar.V_n}
+        self.counts = {vn: [] for vn in grammar.V_n}  # counts[A][n] = derivations of A with n terminal characters
+        self.sequence_counts = {}  # (symbols, j, n) -> derivations of symbols[j:] with n characters
+
+    def count(self, symbol, n):
+        """ Number of derivations of symbol that yield exactly n characters (big ints, no overflow). """
+        if symbol not in self.counts:
+            return 1 if len(symbol) == n else 0  # a terminal only yields itself
+        if n < 0:
+            return 0
+        self.extend(n)
+        return self.counts[symbol][n]
+
+    def extend(self, max_length):
+        """ Fills the DP table bottom-up, one length at a time, so the recursion never goes deep. """
+        done = min(len(row) for row in self.counts.values()) - 1
+        for n in range(done + 1, max_length + 1):
+            for vn in sorted(self.counts):
+                self._count_at(vn, n)
+
+    def _count_at(self, vn, n):
+        """ Counts derivations of vn at length n, every shorter length is already in the table. """
+        row = self.counts[vn]
+        if len(row) > n:
+            if row[n] == IN_PROGRESS:
+                raise ValueError(f"Cycle of ε/unit productions through '{vn}', strings can't be counted")
+            return row[n]
+
+        row.append(IN_PROGRESS)
+        row[n] = sum(self.sequence_count(symbols, 0, n) for symbols in self.productions[vn])
+        return row[n]
+
+    def sequence_count(self, symbols, j, n):
+        """ Number of ways symbols[j:] derive exactly n characters. """
+        if j == len(symbols):
+            return 1 if n == 0 else 0
+
+        key = (symbols, j, n)
+        total = self.sequence_counts.get(key)
+        if total is None:
+            head = symbols[j]
+            if head in self.counts:
+                # the only same-length dependency is head taking all n characters, it is resolved recursively
+                total = sum(self._count_at(head, m) * self.sequence_count(symbols, j + 1, n - m)
+                            for m in range(n + 1))
+            else:
+                total = self.sequence_count(symbols, j + 1, n - len(head)) if len(head) <= n else 0
+            self.sequence_counts[key] = total
+        return total
+
+    def count_strings(self, max_length):
+        """ Number of derivations of every length 0..max_length from the start symbol. """
+        return [self.count(self.grammar.S, n) for n in range(max_length + 1)]
+
+    def sample(self, length, rng=random):
+        """ Draws one derivation with exactly length characters, uniformly, without rejections. """
+        total = self.count(self.grammar.S, length)
+        if total == 0:
+            raise ValueError(f"The grammar derives no string of length {length}")
+
+        result = []
+        # explicit stack of (symbols, position, characters left), so long strings don't hit the recursion limit
+        stack = [((self.grammar.S,), 0, length)]
+        while stack:
+            symbols, j, n = stack.pop()
+            if j == len(symbols):
+                continue
+            head = symbols[j]
+
+            if head not in self.counts:
+                result.append(head)
+                stack.append((symbols, j + 1, n - len(head)))
+                continue
+
+            # choosing how many characters head yields, weighted by the completions of the rest
+            r = rng.randrange(self.sequence_count(symbols, j, n))
+            for m in range(n + 1):
+                weight = self.count(head, m) * self.sequence_count(symbols, j + 1, n - m)
+                if r < weight:
+                    break
+                r -= weight
+            stack.append((symbols, j + 1, n - m))
+
+            # choosing the production of head, weighted by how many derivations of length m it has
+            r = rng.randrange(self.count(head, m))
+            for production in self.productions[head]:
+                weight = self.sequence_count(production, 0, m)
+                if r < weight:
+                    break
+                r -= weight
+            stack.append((production, 0, m))
+
+        return "".join(result)
+
+
+def is_right_linear(grammar):
+    """ Checks that every right-hand side is terminals followed by at most one non-terminal. """
+    return all(symbol not in grammar.V_n
+               for vn in grammar.V_n for symbols in grammar.production_symbols(vn) for symbol in symbols[:-1])
+
+
+class LanguageCounter:
+    """ Counts and samples the strings of a right-linear grammar on its DFA, where every string has one path. """
+    def __init__(self, grammar):
+        """ The Constructor of the class. """
+        # the automaton follows the grammar character by character: A -> w B is a chain of states
+        # spelling w that ends in B, A -> w ends in the final state, A -> B is an ε-move
+        final = "f"
+        state = {vn: f"n{i}" for i, vn in enumerate(sorted(grammar.V_n))}
+        Delta = {}
+        chains = 0
+        for vn in grammar.V_n:
+            for symbols in grammar.production_symbols(vn):
+                target = final
+                if symbols and symbols[-1] in grammar.V_n:
+                    target = state[symbols[-1]]
+                    symbols = symbols[:-1]
+                word = "".join(symbols)
+                current = state[vn]
+                for k, character in enumerate(word):
+                    if k + 1 == len(word):
+                        next_state = target
+                    else:
+                        next_state = f"c{chains}"
+                        chains += 1
+                    Delta.setdefault((current, character), set()).add(next_state)
+                    current = next_state
+                if not word:
+                    Delta.setdefault((current, ec.EPSILON), set()).add(target)
+
+        Q = set(state.values()) | {final}
+        Sigma = {symbol for _, symbol in Delta} - {ec.EPSILON}
+        fa = finite_automaton.FiniteAutomaton(Q, Sigma, Delta, state[grammar.S], {final})
+        self.dfa = fa.convert_ndfa_to_dfa().compile()
+        self.counts = [list(self.dfa.accepting)]  # counts[n][q] = strings of length n accepted from state q
+
+    def count(self, state, n):
+        """ Number of strings of length n accepted from a state of the DFA (big ints, no overflow). """
+        dfa = self.dfa
+        width = len(dfa.symbols)
+        while len(self.counts) <= n:
+            shorter = self.counts[-1]
+            self.counts.append([sum(shorter[dfa.table[q * width + column]] for column in range(width))
+                                for q in range(len(dfa.states))])
+        return self.counts[n][state]
+
+    def count_strings(self, max_length):
+        """ Number of strings of every length 0..max_length in the language. """
+        return [self.count(self.dfa.start, n) for n in range(max_length + 1)]
+
+    def sample(self, length, rng=random):
+        """ Draws one string with exactly length characters, uniformly, without rejections. """
+        dfa = self.dfa
+        width = len(dfa.symbols)
+        state = dfa.start
+        if self.count(state, length) == 0:
+            raise ValueError(f"The grammar derives no string of length {length}")
+
+        # every character is chosen with the weight of the strings that can still follow it
+        result = []
+        for n in range(length, 0, -1):
+            r = rng.randrange(self.count(state, n))
+            for column in range(width):
+                next_state = dfa.table[state * width + column]
+                weight = self.count(next_state, n - 1)
+                if r < weight:
+                    break
+                r -= weight
+            result.append(dfa.symbols[column])
+            state = next_state
+        return "".join(result)
@@ -0,0 +1,366 @@
+import itertools
+from abc import ABC, abstractmethod
+
+SPECIAL = "()|*+^"
+SMALL_EXPANSION = 1024  # nodes with at most this many strings are expanded once and iterated as a list
+
+
+class ASTNode(ABC):
+    """ A node of a parsed pattern, its expansion depends on max_reps (the bound of * and +). """
+    def __init__(self, source):
+        self.source = source  # the part of the pattern this node was parsed from
+        self._counts = {}  # max_reps -> count
+        self._expansions = {}  # max_reps -> list, only for small nodes
+
+    @abstractmethod
+    def __repr__(self):
+        pass
+
+    def pretty(self, indent=0):
+        return "  " * indent + repr(self)
+
+    def count(self, max_reps):
+        if max_reps not in self._counts:
+            self._counts[max_reps] = self._count(max_reps)
+        return self._counts[max_reps]
+
+    def iter_from(self, k, max_reps):
+        """ The expansion in order, starting at rank k. """
+        if self.count(max_reps) <= SMALL_EXPANSION:
+            if max_reps not in self._expansions:
+                self._expansions[max_reps] = list(self._iter_from(0, max_reps))
+            return itertools.islice(self._expansions[max_reps], k, None)
+        return self._iter_from(k, max_reps)
+
+    @abstractmethod
+    def _count(self, max_reps):
+        pass
+
+    @abstractmethod
+    def _iter_from(self, k, max_reps):
+        pass
+
+    @abstractmethod
+    def unrank(self, k, max_reps):
+        pass
+
+    @abstractmethod
+    def best_ranks(self, s, pos, max_reps, memo):
+        """ {end: smallest rank of this node producing s[pos:end]}, memo is shared by one rank() call. """
+        pass
+
+
+class Literal(ASTNode):
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+    def __repr__(self):
+        return f"Literal({self.value!r})"
+
+    def _count(self, max_reps):
+        return 1
+
+    def _iter_from(self, k, max_reps):
+        return iter((self.value,) if k == 0 else ())
+
+    def unrank(self, k, max_reps):
+        return self.value
+
+    def best_ranks(self, s, pos, max_reps, memo):
+        return {pos + len(self.value): 0} if s.startswith(self.value, pos) else {}
+
+
+class Concat(ASTNode):
+    def __init__(self, items, source):
+        super().__init__(source)
+        self.items = items  # list of ASTNode
+
+    def __repr__(self):
+        return f"Concat({self.items})"
+
+    def pretty(self, indent=0):
+        out = "  " * indent + "Concat([\n"
+        for item in self.items:
+            out += item.pretty(indent + 1) + ",\n"
+        out += "  " * indent + "])"
+        return out
+
+    def _count(self, max_reps):
+        total = 1
+        for item in self.items:
+            total *= item.count(max_reps)
+        return total
+
+    def _iter_from(self, k, max_reps):
+        return walk_sequence(self.items, k, max_reps)
+
+    def unrank(self, k, max_reps):
+        return unrank_sequence(self.items, k, max_reps)
+
+    def best_ranks(self, s, pos, max_reps, memo):
+        return best_ranks_sequence(self.items, s, pos, max_reps, memo)
+
+
+class Alternation(ASTNode):
+    def __init__(self, options, source):
+        super().__init__(source)
+        self.options = options  # list of ASTNode, in pattern order
+
+    def __repr__(self):
+        return f"Alternation({self.options})"
+
+    def pretty(self, indent=0):
+        out = "  " * indent + "Alternation([\n"
+        for option in self.options:
+            out += option.pretty(indent + 1) + ",\n"
+        out += "  " * indent + "])"
+        return out
+
+    def _count(self, max_reps):
+        return sum(option.count(max_reps) for option in self.options)
+
+    def _iter_from(self, k, max_reps):
+        for i, option in enumerate(self.options):
+            count = option.count(max_reps)
+            if k < count:
+                yield from option.iter_from(k, max_reps)
+                for rest in self.options[i + 1:]:
+                    yield from rest.iter_from(0, max_reps)
+                return
+            k -= count
+
+    def unrank(self, k, max_reps):
+        for option in self.options:
+            count = option.count(max_reps)
+            if k < count:
+                return option.unrank(k, max_reps)
+            k -= count
+        raise IndexError("rank out of range")
+
+    def best_ranks(self, s, pos, max_reps, memo):
+        result = {}
+        offset = 0
+        for option in self.options:
+            for end, r in cached_best_ranks(option, s, pos, max_reps, memo).items():
+                if end not in result or offset + r < result[end]:
+                    result[end] = offset + r
+            offset += option.count(max_reps)
+        return result
+
+
+class Repeat(ASTNode):
+    def __init__(self, item, low, high, source):
+        super().__init__(source)
+        self.item = item
+        self.low = low
+        self.high = high  # None means max_reps
+
+    def __repr__(self):
+        return f"Repeat({self.item}, {self.low}, {'max_reps' if self.high is None else self.high})"
+
+    def pretty(self, indent=0):
+        return "  " * indent + f"Repeat({self.item.pretty().strip()}, {self.low}, {'max_reps' if self.high is None else self.high})"
+
+    def reps(self, max_reps):
+        return range(self.low, (max_reps if self.high is None else self.high) + 1)
+
+    def _count(self, max_reps):
+        # k^r summed over the repetition counts, a geometric series
+        k = self.item.count(max_reps)
+        reps = self.reps(max_reps)
+        if k > 1:
+            return (k ** reps.stop - k ** reps.start) // (k - 1)
+        return sum(k ** r for r in reps)
+
+    def blocks(self, k, max_reps):
+        # the repetition count r that rank k falls in and the rank inside that block
+        n = self.item.count(max_reps)
+        for r in self.reps(max_reps):
+            block = n ** r
+            if k < block:
+                return r, k
+            k -= block
+        raise IndexError("rank out of range")
+
+    def _iter_from(self, k, max_reps):
+        if k >= self.count(max_reps):
+            return
+        r, k = self.blocks(k, max_reps)
+        yield from walk_sequence([self.item] * r, k, max_reps)
+        for r in range(r + 1, self.reps(max_reps).stop):
+            yield from walk_sequence([self.item] * r, 0, max_reps)
+
+    def unrank(self, k, max_reps):
+        r, k = self.blocks(k, max_reps)
+        return unrank_sequence([self.item] * r, k, max_reps)
+
+    def best_ranks(self, s, pos, max_reps, memo):
+        # r copies are a sequence, so the states after t copies are extended one copy at a time
+        n = self.item.count(max_reps)
+        result = {}
+        offset = 0
+        states = {pos: 0}
+        for r in range(self.reps(max_reps).stop):
+            if r >= self.low:
+                for end, rank in states.items():
+                    if end not in result or offset + rank < result[end]:
+                        result[end] = offset + rank
+                offset += n ** r
+            next_states = {}
+            for start, rank in states.items():
+                for end, r_item in cached_best_ranks(self.item, s, start, max_reps, memo).items():
+                    value = rank * n + r_item
+                    if end not in next_states or value < next_states[end]:
+                        next_states[end] = value
+            states = next_states
+        return result
+
+
+def cached_best_ranks(node, s, pos, max_reps, memo):
+    key = (id(node), pos)
+    if key not in memo:
+        memo[key] = node.best_ranks(s, pos, max_reps, memo)
+    return memo[key]
+
+
+def sequence_digits(items, k, max_reps):
+    # mixed radix, the first item is the most significant digit
+    digits = []
+    for item in reversed(items):
+        k, digit = divmod(k, item.count(max_reps))
+        digits.append(digit)
+    digits.reverse()
+    return digits
+
+
+def walk_sequence(items, k, max_reps):
+    # depth-first with one iterator per item, so only the current combination is kept in memory;
+    # until the first combination every item starts at its digit of k, afterwards at 0
+    total = 1
+    for item in items:
+        total *= item.count(max_reps)
+    if k >= total:
+        return
+    if not items:
+        yield ""
+        return
+
+    digits = sequence_digits(items, k, max_reps)
+    parts = [""] * len(items)
+    iterators = [items[0].iter_from(digits[0], max_reps)]
+    resuming = True
+    while iterators:
+        choice = next(iterators[-1], None)
+        if choice is None:
+            iterators.pop()
+            continue
+        depth = len(iterators) - 1
+        parts[depth] = choice
+        if depth + 1 == len(items):
+            resuming = False
+            yield "".join(parts)
+        else:
+            iterators.append(items[depth + 1].iter_from(digits[depth + 1] if resuming else 0, max_reps))
+
+
+def unrank_sequence(items, k, max_reps):
+    return "".join(item.unrank(digit, max_reps) for item, digit in zip(items, sequence_digits(items, k, max_reps)))
+
+
+def best_ranks_sequence(items, s, pos, max_reps, memo):
+    # a smaller rank of an earlier item always wins (later digits are below their radix), so
+    # keeping the smallest partial rank per position is enough
+    states = {pos: 0}
+    for item in items:
+        n = item.count(max_reps)
+        next_states = {}
+        for start, rank in states.items():
+            for end, r_item in cached_best_ranks(item, s, start, max_reps, memo).items():
+                value = rank * n + r_item
+                if end not in next_states or value < next_states[end]:
+                    next_states[end] = value
+        states = next_states
+    return states
+
+
+class Parser:
+    """ Recursive descent: alternation := concat ('|' concat)*, concat := repeat*, repeat := atom quantifier? """
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.position = 0
+
+    def peek(self):
+        return self.pattern[self.position] if self.position < len(self.pattern) else None
+
+    def advance(self):
+        current = self.peek()
+        self.position += 1
+        return current
+
+    def parse(self):
+        node = self.parse_alternation()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token: {self.peek()} at position {self.position}")
+        return node
+
+    def parse_alternation(self):
+        start = self.position
+        options = [self.parse_concat()]
+        while self.peek() == "|":
+            self.advance()
+            options.append(self.parse_concat())
+        if len(options) == 1:
+            return options[0]
+        return Alternation(options, self.pattern[start:self.position])
+
+    def parse_concat(self):
+        start = self.position
+        items = []
+        while self.peek() is not None and self.peek() not in "|)":
+            items.append(self.parse_repeat())
+        if len(items) == 1:
+            return items[0]
+        if not items:
+            return Literal("")
+        return Concat(items, self.pattern[start:self.position])
+
+    def parse_repeat(self):
+        start = self.position
+        atom = self.parse_atom()
+        token = self.peek()
+        if token == "*":
+            self.advance()
+            node = Repeat(atom, 0, None, self.pattern[start:self.position])
+        elif token == "+":
+            self.advance()
+            node = Repeat(atom, 1, None, self.pattern[start:self.position])
+        elif token == "^":
+            self.advance()
+            digits = ""
+            while self.peek() is not None and self.peek().isdigit():
+                digits += self.advance()
+            if not digits:
+                raise ValueError(f"Expected a number after '^' at position {self.position}")
+            node = Repeat(atom, int(digits), int(digits), self.pattern[start:self.position])
+        else:
+            return atom
+        if self.peek() is not None and self.peek() in "*+^":
+            raise ValueError(f"Unexpected token: {self.peek()} at position {self.position}")
+        return node
+
+    def parse_atom(self):
+        token = self.peek()
+        if token == "(":
+            start = self.position
+            self.advance()
+            inner = self.parse_alternation()
+            if self.advance() != ")":
+                raise ValueError(f"Missing ')' for the group at position {start}")
+            source = self.pattern[start:self.position]
+            # a group is always an Alternation, so it is shown as one choice even with a single option
+            options = inner.options if isinstance(inner, Alternation) else [inner]
+            return Alternation(options, source)
+        if token is None or token in SPECIAL:
+            raise ValueError(f"Unexpected token: {token} at position {self.position}")
+        return Literal(self.advance())
@@ -1,141 +1,134 @@
 import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import regex_ast
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern):
+    # parsed once per pattern, every other function works on the cached AST
+    return regex_ast.Parser(pattern).parse()
+
+def count_pattern(pattern, max_reps=5):
+    # exact size of the expansion (big ints), geometric series for * and + and powers for ^n
+    return compile_pattern(pattern).count(max_reps)
+
+def iter_pattern(pattern, max_reps=5, debug=False, start=0, stop=None):
+    # depth-first over the AST, so only the current combination is kept in memory and the order
+    # is the same as expand_pattern; start/stop select the ranks start..stop-1 without walking the ones before start
+    root = compile_pattern(pattern)
+    if debug: print(f"Parsed:\n{root.pretty()}")
+    combinations = root.iter_from(start, max_reps)
+    return combinations if stop is None else itertools.islice(combinations, max(stop - start, 0))
 
 def expand_pattern(pattern, max_reps=5, debug=False):
-    def tokenize(pat):
-        tokens = []
-        i = 0
-        while i < len(pat):
-            if pat[i] == '(':
-                j = i + 1
-                depth = 1
-                while j < len(pat) and depth:
-                    if pat[j] == '(':
-                        depth += 1
-                    elif pat[j] == ')':
-                        depth -= 1
-                    j += 1
-                tokens.append(pat[i:j])
-                i = j
-            elif pat[i] in '*+':
-                tokens.append(pat[i])
-                i += 1
-            elif pat[i] == '^':
-                j = i + 1
-                while j < len(pat) and pat[j].isdigit():
-                    j += 1
-                tokens.append(pat[i:j])
-                i = j
-            elif pat[i].isdigit():
-                num = ""
-                while i < len(pat) and pat[i].isdigit():
-                    num += pat[i]
-                    i += 1
-                for digit in num:
-                    tokens.append(digit)
-            else:
-                tokens.append(pat[i])
-                i += 1
-        return tokens
-
-    def interpret_token(token):
-        if debug: print(f"Interpreting token: {token}")
-        if token.startswith('('):
-            return token[1:-1].split('|')
-        elif token in ['*', '+']:
-            return token
-        elif token.startswith('^'):
-            return token
-        else:
-            return [token]
-
-    def generate_combinations(tokens):
-        stack = [[]]
-        i = 0
-        while i < len(tokens):
-            tok = tokens[i]
-            interpreted = interpret_token(tok)
-            next_token = tokens[i + 1] if i + 1 < len(tokens) else None
-            op = None
-
-            if next_token in ['*', '+'] or (next_token and next_token.startswith('^')):
-                op = next_token
-                i += 1
-
-            new_stack = []
-            for entry in stack:
-                if isinstance(interpreted, list):
-                    if op == '*':
-                        new_stack.append(entry)
-                        for r in range(1, max_reps + 1):
-                            for combo in itertools.product(interpreted, repeat=r):
-                                new_stack.append(entry + list(combo))
-                    elif op == '+':
-                        for r in range(1, max_reps + 1):
-                            for combo in itertools.product(interpreted, repeat=r):
-                                new_stack.append(entry + list(combo))
-                    elif op and op.startswith('^'):
-                        count = int(op[1:])
-                        for combo in itertools.product(interpreted, repeat=count):
-                            new_stack.append(entry + list(combo))
-                    else:
-                        for val in interpreted:
-                            new_stack.append(entry + [val])
-                else:
-                    raise ValueError(f"Unexpected token: {interpreted}")
-            stack = new_stack
-            i += 1
-        return [''.join(s) for s in stack]
-
-    tokens = tokenize(pattern)
-    if debug: print(f"Tokenized: {tokens}")
-    return generate_combinations(tokens)
+    return list(iter_pattern(pattern, max_reps, debug))
+
+def unrank(pattern, k, max_reps=5):
+    # k-th combination of expand_pattern(pattern, max_reps) without generating the ones before it
+    root = compile_pattern(pattern)
+    total = root.count(max_reps)
+    if not 0 <= k < total:
+        raise IndexError(f"rank {k} out of range for {total} combinations")
+    return root.unrank(k, max_reps)
+
+def rank(pattern, s, max_reps=5):
+    # position of s in expand_pattern(pattern, max_reps), the first one if s shows up more than once
+    ranks = compile_pattern(pattern).best_ranks(s, 0, max_reps, {})
+    if len(s) not in ranks:
+        raise ValueError(f"'{s}' is not generated by {pattern}")
+    return ranks[len(s)]
+
+def sample(pattern, n, seed=None, max_reps=5):
+    # n combinations drawn uniformly (with replacement) through random ranks, each costs O(pattern length)
+    rng = random.Random(seed)
+    root = compile_pattern(pattern)
+    total = root.count(max_reps)
+    return [root.unrank(rng.randrange(total), max_reps) for _ in range(n)]
+
+def expand_shard(pattern, max_reps, start, stop, path, batch=65536):
+    # writes the ranks start..stop-1 to one file, in batches so the per-line write calls don't dominate
+    written = 0
+    combinations = iter_pattern(pattern, max_reps, start=start, stop=stop)
+    with open(path, "w") as f:
+        while True:
+            chunk = list(itertools.islice(combinations, batch))
+            if not chunk:
+                break
+            f.write("\n".join(chunk))
+            f.write("\n")
+            written += len(chunk)
+    return written
+
+def expand_to_files(pattern, out_dir, shards=None, workers=None, max_reps=5, prefix="combinations"):
+    # splits the rank space into contiguous shards written by a process pool, the shard files
+    # concatenated in order are exactly expand_pattern(pattern, max_reps); manifest.json records the counts
+    shards = shards or workers or os.cpu_count() or 1
+    total = count_pattern(pattern, max_reps)
+    os.makedirs(out_dir, exist_ok=True)
+
+    bounds = [total * i // shards for i in range(shards + 1)]
+    paths = [os.path.join(out_dir, f"{prefix}_{i:05d}.txt") for i in range(shards)]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(expand_shard, pattern, max_reps, bounds[i], bounds[i + 1], paths[i])
+                   for i in range(shards)]
+        written = [future.result() for future in futures]
+    seconds = time.perf_counter() - started
+
+    manifest = {
+        "pattern": pattern,
+        "max_reps": max_reps,
+        "total": total,
+        "shards": [{"file": os.path.basename(paths[i]), "start": bounds[i], "stop": bounds[i + 1], "count": written[i]}
+                   for i in range(shards)],
+        "seconds": seconds,
+        "combinations_per_second": total / seconds if seconds else float("inf"),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
 
 # Bonus: Processing steps
 def show_processing_steps(pattern):
     print(f"\n--- Processing Steps for: {pattern} ---")
+    root = compile_pattern(pattern)
+    items = root.items if isinstance(root, regex_ast.Concat) else [root] if root.source else []
     step = 1
-    i = 0
-    while i < len(pattern):
-        if pattern[i] == '(':
-            j = i + 1
-            depth = 1
-            while j < len(pattern) and depth:
-                if pattern[j] == '(':
-                    depth += 1
-                elif pattern[j] == ')':
-                    depth -= 1
-                j += 1
-            group = pattern[i+1:j-1].split('|')
-            print(f"[Step {step}] Found group: {pattern[i:j]} → will choose one of: {group}")
-            i = j
-        elif pattern[i] in '*+':
-            if pattern[i] == '*':
-                print(f"[Step {step}] Found repetition: '*' → applies to previous element 0–5 times")
-            else:
-                print(f"[Step {step}] Found repetition: '+' → applies to previous element 1–5 times")
-            i += 1
-        elif pattern[i] == '^':
-            j = i + 1
-            while j < len(pattern) and pattern[j].isdigit():
-                j += 1
-            count = pattern[i+1:j]
-            print(f"[Step {step}] Found exact repetition: '^{count}' → applies to previous element exactly {count} times")
-            i = j
-        elif pattern[i].isdigit():
-            print(f"[Step {step}] Found literal digit: '{pattern[i]}'")
-            i += 1
+    for item in items:
+        repeat = item if isinstance(item, regex_ast.Repeat) else None
+        element = repeat.item if repeat else item
+        if isinstance(element, regex_ast.Alternation):
+            group = [option.source for option in element.options]
+            print(f"[Step {step}] Found group: {element.source} → will choose one of: {group}")
+        elif element.source.isdigit():
+            print(f"[Step {step}] Found literal digit: '{element.source}'")
+        else:
+            print(f"[Step {step}] Found character: '{element.source}'")
+        step += 1
+
+        if repeat is None:
+            continue
+        if repeat.high is None:
+            sign = '*' if repeat.low == 0 else '+'
+            print(f"[Step {step}] Found repetition: '{sign}' → applies to previous element {repeat.low}–5 times")
         else:
-            print(f"[Step {step}] Found character: '{pattern[i]}'")
-            i += 1
+            print(f"[Step {step}] Found exact repetition: '^{repeat.high}' → applies to previous element exactly {repeat.high} times")
         step += 1
 
 def save_combinations_to_file(patterns, filename="combinations_output.txt"):
     with open(filename, "w") as f:
         for pat in patterns:
             f.write(f"Pattern: {pat}\n")
-            results = expand_pattern(pat, debug=False)
-            f.write(f"Generated {len(results)} combinations.\n")
-            for item in results:
+            total = count_pattern(pat)
+            f.write(f"Generated {total} combinations.\n")
+            for item in iter_pattern(pat):
                 f.write(f"{item}\n")
             f.write("\n" + "="*40 + "\n\n")
     print(f"\nAll combinations saved to '{filename}'")
@@ -152,9 +145,9 @@ def main():
     print("=== Generating Combinations ===")
     for pat in patterns:
         print(f"\nPattern: {pat}")
-        results = expand_pattern(pat, debug=False)
-        print(f"Generated {len(results)} combinations. Sample:")
-        print("\n".join(results[:5]), "...\n")
+        total = count_pattern(pat)
+        print(f"Generated {total} combinations. Sample:")
+        print("\n".join(itertools.islice(iter_pattern(pat), 5)), "...\n")
 
     print("=== Bonus: Processing Steps ===")
     for pat in patterns: